@@ -0,0 +1,230 @@
+import time
+import numpy as np
+import pandas as pd
+
+# Bookings spanning more than this are also checked against the next day
+NEXT_DAY_MIN_SPAN = pd.Timedelta(hours=12)
+
+
+def _to_ns(values) -> np.ndarray:
+    """Convert a datetime-like column to int64 nanoseconds (NaT becomes int64 min)"""
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _build_interval_index(starts: np.ndarray, ends: np.ndarray, positions: np.ndarray):
+    """Paint closed [start, end] intervals onto elementary regions, lowest position wins"""
+    breakpoints = np.unique(np.concatenate([starts, ends]))
+
+    # Region 2*i is breakpoint i itself, region 2*i + 1 the open gap after it
+    owners = np.full(2 * len(breakpoints), -1, dtype=np.int64)
+    region_lo = 2 * np.searchsorted(breakpoints, starts)
+    region_hi = 2 * np.searchsorted(breakpoints, ends)
+
+    # Paint in reverse booking order so the first matching booking ends up on top
+    for lo, hi, position in zip(region_lo[::-1], region_hi[::-1], positions[::-1]):
+        owners[lo:hi + 1] = position
+
+    return breakpoints, owners
+
+
+def _query_interval_index(breakpoints: np.ndarray, owners: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Return the owning booking position for every value, -1 where nothing matches"""
+    result = np.full(len(values), -1, dtype=np.int64)
+    if len(breakpoints) == 0:
+        return result
+
+    idx = np.searchsorted(breakpoints, values, side='right') - 1
+    valid = idx >= 0
+    exact = breakpoints[np.clip(idx, 0, None)] == values
+    region = 2 * idx + np.where(exact, 0, 1)
+    result[valid] = owners[region[valid]]
+    return result
+
+
+def build_component_index(prod_data: pd.DataFrame) -> dict:
+    """Build the component interval index once per run from consumption bookings.
+
+    Expects StartTime/EndTime already corrected for midnight crossings.
+    """
+    starts = _to_ns(prod_data['StartTime'])
+    ends = _to_ns(prod_data['EndTime'])
+    nat = np.iinfo(np.int64).min
+
+    usable = (starts != nat) & (ends != nat) & (starts <= ends)
+    positions = np.flatnonzero(usable)
+    long_running = positions[(ends[positions] - starts[positions]) > NEXT_DAY_MIN_SPAN.value]
+
+    # Bookings ordered by end time (then booking order) for the backward-tolerance search
+    by_end = positions[np.lexsort((positions, ends[positions]))]
+
+    return {
+        'component_ids': prod_data['component_id'].to_numpy(dtype=object),
+        'primary': _build_interval_index(starts[positions], ends[positions], positions),
+        'next_day': _build_interval_index(starts[long_running], ends[long_running], long_running),
+        'ends': ends[by_end],
+        'end_positions': by_end,
+    }
+
+
+def lookup_component_ids(component_index: dict, datetimes: pd.Series) -> pd.Series:
+    """Resolve the component_id for every datetime in one vectorized pass.
+
+    The first booking (in consumption_booking_test order) containing the datetime
+    wins; otherwise long-running bookings are checked against the next day.
+    """
+    values = _to_ns(datetimes)
+    nat = np.iinfo(np.int64).min
+
+    positions = _query_interval_index(*component_index['primary'], values)
+
+    unmatched = (positions == -1) & (values != nat)
+    if unmatched.any():
+        next_day_values = values[unmatched] + pd.Timedelta(days=1).value
+        positions[unmatched] = _query_interval_index(*component_index['next_day'], next_day_values)
+
+    component_ids = np.full(len(values), None, dtype=object)
+    found = positions != -1
+    component_ids[found] = component_index['component_ids'][positions[found]]
+    return pd.Series(component_ids, index=datetimes.index, name='component_id')
+
+
+def lookup_component_ids_with_tolerance(component_index: dict, datetimes: pd.Series, tolerance_minutes: int = 45) -> pd.Series:
+    """Resolve component_ids in one pass, falling back to the previous booking.
+
+    An exact interval match wins. Otherwise the booking that ended most recently
+    before the datetime is used if it ended within tolerance_minutes; a booking
+    that has not started yet is never picked.
+    """
+    values = _to_ns(datetimes)
+    nat = np.iinfo(np.int64).min
+
+    positions = _query_interval_index(*component_index['primary'], values)
+
+    unmatched = np.flatnonzero((positions == -1) & (values != nat))
+    ends = component_index['ends']
+    if len(unmatched) and len(ends):
+        # Last booking ending strictly before each datetime, earliest booking on equal ends
+        idx = np.searchsorted(ends, values[unmatched], side='left') - 1
+        first_of_group = np.searchsorted(ends, ends, side='left')
+        has_previous = idx >= 0
+        idx = first_of_group[np.clip(idx, 0, None)]
+
+        within_tolerance = has_previous & (values[unmatched] - ends[idx] <= pd.Timedelta(minutes=tolerance_minutes).value)
+        positions[unmatched[within_tolerance]] = component_index['end_positions'][idx[within_tolerance]]
+
+    component_ids = np.full(len(values), None, dtype=object)
+    found = positions != -1
+    component_ids[found] = component_index['component_ids'][positions[found]]
+    return pd.Series(component_ids, index=datetimes.index, name='component_id')
+
+
+def _legacy_component_ids(prod_data: pd.DataFrame, datetimes: pd.Series) -> pd.Series:
+    """The previous per-row loop over component ranges, kept for the benchmark"""
+    component_ranges = []
+    for _, row in prod_data.iterrows():
+        component_ranges.append({
+            'start': row['StartTime'],
+            'end': row['EndTime'],
+            'component_id': row['component_id'],
+            'span_hours': (row['EndTime'] - row['StartTime']).total_seconds() / 3600
+        })
+
+    def get_component_id(dt):
+        dt_next_day = dt + pd.Timedelta(days=1)
+        for comp_range in component_ranges:
+            if comp_range['start'] <= dt <= comp_range['end']:
+                return comp_range['component_id']
+        for comp_range in component_ranges:
+            if comp_range['span_hours'] > 12:
+                if comp_range['start'] <= dt_next_day <= comp_range['end']:
+                    return comp_range['component_id']
+        return None
+
+    return datetimes.apply(get_component_id)
+
+
+def _legacy_component_ids_with_tolerance(prod_data: pd.DataFrame, datetimes: pd.Series, tolerance_minutes: int = 45) -> pd.Series:
+    """The previous per-row iterrows matcher from etl.py, kept for the benchmark"""
+    def get_component_id(dt):
+        if pd.isna(dt):
+            return None
+        nearest_component = None
+        min_diff_seconds = float('inf')
+        for _, row in prod_data.iterrows():
+            start = row['StartTime']
+            end = row['EndTime']
+            if pd.isna(start) or pd.isna(end):
+                continue
+            if start <= dt <= end:
+                return row['component_id']
+            if dt > end:
+                diff = (dt - end).total_seconds()
+                if diff <= tolerance_minutes * 60 and diff < min_diff_seconds:
+                    nearest_component = row['component_id']
+                    min_diff_seconds = diff
+        return nearest_component
+
+    return datetimes.apply(get_component_id)
+
+
+def _synthetic_bookings(days: int, bookings_per_day: int, batches_per_day: int):
+    """Random consumption bookings and SMC batch datetimes for the benchmarks"""
+    rng = np.random.default_rng(0)
+    base = pd.Timestamp('2025-05-01 07:00:00')
+
+    starts = base + pd.to_timedelta(np.sort(rng.uniform(0, days * 24, days * bookings_per_day)), unit='h')
+    durations = pd.to_timedelta(rng.uniform(0.2, 1.5, len(starts)), unit='h')
+    # A handful of long-running bookings exercise the next-day fallback
+    durations = durations.where(rng.random(len(starts)) > 0.02, pd.Timedelta(hours=20))
+    prod_data = pd.DataFrame({
+        'StartTime': starts,
+        'EndTime': starts + durations,
+        'component_id': [f"COMP-{i}" for i in range(len(starts))],
+    })
+    datetimes = pd.Series(base + pd.to_timedelta(np.sort(rng.uniform(0, days * 24, days * batches_per_day)), unit='h'))
+    return prod_data, datetimes
+
+
+def _report(label: str, prod_data, datetimes, expected, actual, legacy_seconds, index_seconds):
+    """Print timings and count rows where the two implementations disagree"""
+    mismatches = int((expected.fillna('<none>') != actual.fillna('<none>')).sum())
+    print(f"{label} - bookings: {len(prod_data)}, batches: {len(datetimes)}")
+    print(f"Legacy loop:    {legacy_seconds:.3f}s")
+    print(f"Interval index: {index_seconds:.3f}s ({legacy_seconds / max(index_seconds, 1e-9):.0f}x faster)")
+    print(f"Mismatches: {mismatches}")
+    return mismatches
+
+
+def benchmark(days: int = 30, bookings_per_day: int = 24, batches_per_day: int = 1440):
+    """Compare the interval index against the legacy loop on synthetic bookings"""
+    prod_data, datetimes = _synthetic_bookings(days, bookings_per_day, batches_per_day)
+
+    started = time.perf_counter()
+    expected = _legacy_component_ids(prod_data, datetimes)
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = lookup_component_ids(build_component_index(prod_data), datetimes)
+    index_seconds = time.perf_counter() - started
+
+    return _report("First match", prod_data, datetimes, expected, actual, legacy_seconds, index_seconds)
+
+
+def benchmark_tolerance(days: int = 2, bookings_per_day: int = 24, batches_per_day: int = 1440):
+    """Compare the backward-tolerance matcher against the legacy iterrows loop"""
+    prod_data, datetimes = _synthetic_bookings(days, bookings_per_day, batches_per_day)
+
+    started = time.perf_counter()
+    expected = _legacy_component_ids_with_tolerance(prod_data, datetimes)
+    legacy_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = lookup_component_ids_with_tolerance(build_component_index(prod_data), datetimes)
+    index_seconds = time.perf_counter() - started
+
+    return _report("Backward tolerance", prod_data, datetimes, expected, actual, legacy_seconds, index_seconds)
+
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_tolerance()
@@ -1,4 +1,3 @@
-from functools import lru_cache
 import time
 import pandas as pd
 import numpy as np
@@ -14,37 +13,49 @@ from datetime import datetime, timedelta
 import pymysql
 from sqlalchemy import create_engine
 
+from component_lookup import build_component_index, lookup_component_ids_with_tolerance
+from shift_calendar import compile_shift_calendar, to_foundry_date, to_wall_clock
+from bulk_writer import write_report_rows, ensure_report_summary
+
 warnings.filterwarnings("ignore")
 
 def get_last_processed_timestamp(connection):
     """Get the last processed timestamp from the logger table (most recent entry)"""
+    # Only an empty logger means a fresh start; a failed read propagates so the cycle is
+    # skipped instead of reprocessing (and in multi mode re-inserting) the whole history
+    with connection.cursor() as cursor:
+        # Get the most recent row by ID (descending order)
+        sql = "SELECT last_timestamp FROM additive_report_dummy_rename_id_logger ORDER BY id DESC LIMIT 1"
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        
+        if result and result['last_timestamp']:
+            return pd.to_datetime(result['last_timestamp'])
+        else:
+            return None
+
+def commit_etl_batch(connection, df, target_table, timestamp, bulk_write):
+    """Write the report rows and the new logger entry in a single transaction"""
     try:
+        changed = write_report_rows(df, target_table, connection, bulk_write)
         with connection.cursor() as cursor:
-            # Get the most recent row by ID (descending order)
-            sql = "SELECT last_timestamp FROM additive_report_dummy_rename_id_logger ORDER BY id DESC LIMIT 1"
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            
-            if result and result['last_timestamp']:
-                return pd.to_datetime(result['last_timestamp'])
-            else:
-                return None
-    except Exception as e:
-        print(f"Error getting last processed timestamp: {e}")
-        return None
-
-def insert_logger_entry(connection, timestamp):
-    """Insert a new row in the logger table with the current timestamp"""
-    try:
-        with connection.cursor() as cursor:
-            sql = "INSERT INTO additive_report_dummy_rename_id_logger (last_timestamp) VALUES (%s)"
-            cursor.execute(sql, (timestamp,))
+            if timestamp is not None:
+                sql = "INSERT INTO additive_report_dummy_rename_id_logger (last_timestamp) VALUES (%s)"
+                cursor.execute(sql, (timestamp,))
+            elif changed:
+                # Rows were only rewritten in place: a new logger id with the same watermark
+                # still invalidates the API response caches and ETags. Re-upserting unchanged
+                # overlap rows leaves both alone
+                sql = ("INSERT INTO additive_report_dummy_rename_id_logger (last_timestamp) "
+                       "SELECT last_timestamp FROM additive_report_dummy_rename_id_logger ORDER BY id DESC LIMIT 1")
+                cursor.execute(sql)
         
         connection.commit()
-        print(f"New logger entry created: Last timestamp = {timestamp}")
-    except Exception as e:
-        print(f"Error inserting logger entry: {e}")
+        print(f"Committed {len(df)} records, last timestamp = {timestamp}")
+    except Exception:
+        # Nothing from this batch is kept, the next run resumes from the previous entry
         connection.rollback()
+        raise
 
 def run_etl(config, engine, connection, target_table):
     """Main ETL function"""
@@ -62,13 +73,16 @@ def run_etl(config, engine, connection, target_table):
     # df_add = pd.read_sql("SELECT * FROM scada_data", engine)
     # prod_data = pd.read_sql("SELECT * FROM consumption_booking_test", engine)
 
+    # Look-back window in days for the source reads
+    lookback_days = int(config.get("lookback_days", 1))
+
     # For scada_data
     df_add = pd.read_sql(
-        """
+        f"""
         SELECT *
         FROM scada_data
         WHERE (datetime) >= (
-            SELECT MAX(datetime) - INTERVAL 1 DAY
+            SELECT MAX(datetime) - INTERVAL {lookback_days} DAY
             FROM scada_data
         )
         """,
@@ -77,11 +91,11 @@ def run_etl(config, engine, connection, target_table):
 
     # For prepared_sand_extra_test
     smc_df = pd.read_sql(
-        """
+        f"""
         SELECT *
         FROM prepared_sand_extra_test
         WHERE date >= (
-            SELECT MAX(date) - INTERVAL 1 DAY
+            SELECT MAX(date) - INTERVAL {lookback_days} DAY
             FROM prepared_sand_extra_test
         )
         """,
@@ -90,11 +104,11 @@ def run_etl(config, engine, connection, target_table):
 
     # For consumption_booking_test
     prod_data = pd.read_sql(
-        """
+        f"""
         SELECT *
         FROM consumption_booking_test
         WHERE date >= (
-            SELECT MAX(date) - INTERVAL 1 DAY
+            SELECT MAX(date) - INTERVAL {lookback_days} DAY
             FROM consumption_booking_test
         )
         """,
@@ -103,15 +117,9 @@ def run_etl(config, engine, connection, target_table):
 
     df_add['datetime']=pd.to_datetime(df_add['datetime'],format='%Y-%m-%d %H:%M:%S')
     
-    def date_adjust(data: pd.DataFrame, col_name: str, to_foundry: bool):
-        shift_cutoff = pd.to_datetime(config["shift_time"]["A"][0]).time()
-        multiplier = 1 if to_foundry else -1
-
-        time_mask = data[col_name].dt.time < shift_cutoff
-
-        data["datetime"] = data["datetime"] + pd.to_timedelta(time_mask.astype(int) * -1 * multiplier, unit='D')
-        return data
-    df_add = date_adjust(df_add,"datetime",True)
+    # Move early-morning readings onto the foundry day they belong to
+    shift_calendar = compile_shift_calendar(config["shift_time"])
+    df_add['datetime'] = to_foundry_date(shift_calendar, df_add['datetime'])
 
     column_pairs = [
         ('Bentonite_set_value', 'Bentonite_actual_value'),
@@ -171,71 +179,14 @@ def run_etl(config, engine, connection, target_table):
     prod_data['StartTime'] = pd.to_datetime(prod_data['date'] + pd.to_timedelta(prod_data['start_time']))
     prod_data['EndTime'] = pd.to_datetime(prod_data['date'] + pd.to_timedelta(prod_data['end_time']))
    
-    def get_component_id(dt, prod_data, tolerance_minutes=45, debug=False):
-        """
-        Returns the ComponentId for datetime `dt` from prod_data (already in foundry time).
-        - Exact match wins.
-        - If dt lies between components, prefer *previous* component (never the next one).
-        - Tolerance only applies backward (after end time).
-        """
-        if pd.isna(dt):
-            return None
-    
-        dt = pd.to_datetime(dt, errors='coerce')
-        if pd.isna(dt):
-            return None
-    
-        df = prod_data.copy()
-        df['StartTime'] = pd.to_datetime(df['StartTime'], errors='coerce')
-        df['EndTime'] = pd.to_datetime(df['EndTime'], errors='coerce')
-    
-        nearest_component = None
-        min_diff_seconds = float('inf')
-    
-        for _, row in df.iterrows():
-            comp = row.get('ComponentId', None)
-            if comp is None:
-                continue
-    
-            start = row['StartTime']
-            end = row['EndTime']
-            if pd.isna(start) or pd.isna(end):
-                continue
-    
-            # Handle intervals crossing midnight
-            if end < start:
-                end += timedelta(days=1)
-    
-            # --- Exact match ---
-            if start <= dt <= end:
-                if debug:
-                    print(f" Exact match: {comp} ({start.time()} - {end.time()})")
-                return comp
-    
-            # --- If dt is after end (backward tolerance) ---
-            if dt > end:
-                diff = (dt - end).total_seconds()
-                if diff <= tolerance_minutes * 60 and diff < min_diff_seconds:
-                    nearest_component = comp
-                    min_diff_seconds = diff
-                    if debug:
-                        print(f"⬅️  Using previous component {comp}, diff={diff/60:.1f} min")
-    
-            # --- If dt < start (future interval) ---
-            # Skip — foundry rule: do not pick future component before it starts
-            elif dt < start:
-                continue
-    
-        if debug:
-            if nearest_component:
-                print(f"Final chosen component: {nearest_component}")
-            else:
-                print("No component found within tolerance")
-    
-        return nearest_component               
-    
-    matched_df['component_id'] = matched_df['datetime'].apply(
-    lambda x: get_component_id(x, prod_data, tolerance_minutes=45, debug=False))
+    # Handle intervals crossing midnight once, up front
+    midnight_crossings = prod_data['EndTime'] < prod_data['StartTime']
+    prod_data.loc[midnight_crossings, 'EndTime'] += pd.Timedelta(days=1)
+
+    # Exact interval wins, else the previous component within a 45 minute backward tolerance
+    component_index = build_component_index(prod_data)
+    matched_df['component_id'] = lookup_component_ids_with_tolerance(
+        component_index, matched_df['datetime'], tolerance_minutes=45)
     matched_df['mixer_name'] = config['Mixer Name']
     matched_df['water_actual'] = matched_df['total_water']
     df = matched_df[config["columns_to_select"]]
@@ -243,20 +194,8 @@ def run_etl(config, engine, connection, target_table):
     df['date'] = pd.to_datetime(df['date'])
     df['time'] = pd.to_timedelta(df['time'].astype(str)).apply(lambda x: (datetime.min + x).time())
 
-    def compute_actual_datetime(row):
-        base_date = row['date']
-        time = row['time']
-        shift = row['shift']
-        base_datetime = datetime.combine(base_date, time)
-
-        # Only shift date forward for early morning times
-        if shift == 'C' and time < datetime.strptime("07:00", "%H:%M").time() and time < datetime.strptime("23:00", "%H:%M").time():
-            return base_datetime + timedelta(days=1)
-        else:
-            return base_datetime
-
-
-    df['timestamp'] = df.apply(compute_actual_datetime, axis=1)
+    # Only the tail of the foundry day (before the first shift starts) moves to the next date
+    df['timestamp'] = to_wall_clock(shift_calendar, matched_df['datetime'])
     df['date']=df['date'].dt.date
 
     df = df.sort_values(by=['timestamp'])
@@ -279,12 +218,20 @@ def run_etl(config, engine, connection, target_table):
     print(df.head())
    
     # Filter out records that already exist in the database
+    upsert = config.get("bulk_write", {}).get("mode") == "upsert"
     if last_timestamp is not None:
-        new_records = df[df['timestamp'] > last_timestamp]
-        old_records = df[df['timestamp'] <= last_timestamp]
+        if upsert:
+            # Rewrite the overlap window too, so batches sharing the watermark second
+            # and late lab values are upserted instead of skipped
+            cutoff = last_timestamp - pd.Timedelta(minutes=config.get("upsert_overlap_minutes", 0))
+            keep = df['timestamp'] >= cutoff
+        else:
+            keep = df['timestamp'] > last_timestamp
+        new_records = df[keep]
+        old_records = df[~keep]
         print(f"Total records: {len(df)}")
         print(f"Records already in database: {len(old_records)}")
-        print(f"New records to insert: {len(new_records)}")
+        print(f"{'Records to upsert' if upsert else 'New records to insert'}: {len(new_records)}")
         df = new_records
     
     # If no new records, return empty dataframe with the latest timestamp
@@ -294,6 +241,9 @@ def run_etl(config, engine, connection, target_table):
     
     # Get the latest timestamp from the new records
     latest_timestamp = df['timestamp'].max()
+    if last_timestamp is not None and latest_timestamp <= last_timestamp:
+        # Only the overlap window was rewritten, the watermark stays where it is
+        latest_timestamp = None
    
     # Check column names match the target schema
     print("Final columns for DB insert:", df.columns.tolist())
@@ -319,6 +269,9 @@ if __name__ == "__main__":
     # Create database engine for pandas
     engine = create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
     
+    # Bulk write settings for the report table
+    bulk_write = config.get("bulk_write", {"mode": "multi", "batch_size": 1000})
+
     # Create a direct pymysql connection for more efficient execution and transactions
     connection = pymysql.connect(
         host=DB_HOST,
@@ -326,12 +279,16 @@ if __name__ == "__main__":
         user=DB_USER,
         password=DB_PASSWORD,
         database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=bulk_write["mode"] == "load_data"
     )
     
     # Define target table
     target_table = "additive_report_dummy_rename"
    
+    # Row count and timestamp range the API reads for unfiltered requests
+    ensure_report_summary(target_table, connection)
+
     print("Starting ETL process...")
  
     # Main ETL loop
@@ -340,17 +297,16 @@ if __name__ == "__main__":
             current_time = datetime.now()
             print(f"Running ETL at {current_time}")
             try:
+                # Reopen the connection if the server dropped it between runs
+                connection.ping(reconnect=True)
                 # Run ETL process
                 df, latest_timestamp = run_etl(config, engine, connection, target_table)
                 
                 # Insert data to the correct table with timestamp column, but only if there are new records
                 if not df.empty:
                     print(f"Writing {len(df)} new records to table: {target_table}")
-                    df.to_sql(target_table, con=engine, if_exists='append', index=False)
-                    
-                    # Insert a new log entry with the latest timestamp
-                    if latest_timestamp:
-                        insert_logger_entry(connection, latest_timestamp)
+                    # Report rows and the new logger entry are committed together
+                    commit_etl_batch(connection, df, target_table, latest_timestamp, bulk_write)
                     
                     print("ETL process completed successfully.")
                 else:
@@ -1,4 +1,3 @@
-from functools import lru_cache
 import time
 import pandas as pd
 import numpy as np
@@ -14,39 +13,51 @@ from datetime import datetime, timedelta
 import pymysql
 from sqlalchemy import create_engine
 
+from component_lookup import build_component_index, lookup_component_ids
+from shift_calendar import compile_shift_calendar, assign_shifts, to_foundry_date, to_wall_clock
+from bulk_writer import write_report_rows, ensure_report_summary
+
 warnings.filterwarnings("ignore")
 
 def get_last_processed_timestamp(connection):
     """Get the last processed timestamp from the logger table (most recent entry)"""
-    try:
-        with connection.cursor() as cursor:
-            # Get the most recent row by ID (descending order)
-            sql = "SELECT last_timestamp FROM additive_report_dummy_logger_mcie ORDER BY id DESC LIMIT 1"
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            
-            if result and result['last_timestamp']:
-                return pd.to_datetime(result['last_timestamp'])
-            else:
-                return None
-    except Exception as e:
-        print(f"Error getting last processed timestamp: {e}")
-        return None
+    # Only an empty logger means a fresh start; a failed read propagates so the cycle is
+    # skipped instead of reprocessing (and in multi mode re-inserting) the whole history
+    with connection.cursor() as cursor:
+        # Get the most recent row by ID (descending order)
+        sql = "SELECT last_timestamp FROM additive_report_dummy_logger_mcie ORDER BY id DESC LIMIT 1"
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        
+        if result and result['last_timestamp']:
+            return pd.to_datetime(result['last_timestamp'])
+        else:
+            return None
 
-def insert_logger_entry(connection, timestamp):
-    """Insert a new row in the logger table with the current timestamp"""
+def commit_etl_batch(connection, df, target_table, timestamp, bulk_write):
+    """Write the report rows and the new logger entry in a single transaction"""
     try:
+        changed = write_report_rows(df, target_table, connection, bulk_write)
         with connection.cursor() as cursor:
-            sql = "INSERT INTO additive_report_dummy_logger_mcie (last_timestamp) VALUES (%s)"
-            cursor.execute(sql, (timestamp,))
+            if timestamp is not None:
+                sql = "INSERT INTO additive_report_dummy_logger_mcie (last_timestamp) VALUES (%s)"
+                cursor.execute(sql, (timestamp,))
+            elif changed:
+                # Rows were only rewritten in place: a new logger id with the same watermark
+                # still invalidates the API response caches and ETags. Re-upserting unchanged
+                # overlap rows leaves both alone
+                sql = ("INSERT INTO additive_report_dummy_logger_mcie (last_timestamp) "
+                       "SELECT last_timestamp FROM additive_report_dummy_logger_mcie ORDER BY id DESC LIMIT 1")
+                cursor.execute(sql)
         
         connection.commit()
-        print(f"New logger entry created: Last timestamp = {timestamp}")
-    except Exception as e:
-        print(f"Error inserting logger entry: {e}")
+        print(f"Committed {len(df)} records, last timestamp = {timestamp}")
+    except Exception:
+        # Nothing from this batch is kept, the next run resumes from the previous entry
         connection.rollback()
+        raise
 
-def run_etl():
+def run_etl(config, engine, connection, target_table):
     """Main ETL function"""
     # Get the last processed timestamp from the logger table
     last_timestamp = get_last_processed_timestamp(connection)
@@ -64,15 +75,9 @@ def run_etl():
 
     df_add['datetime']=pd.to_datetime(df_add['datetime'],format='%Y-%m-%d %H:%M:%S')
     
-    def date_adjust(data: pd.DataFrame, col_name: str, to_foundry: bool):
-        shift_cutoff = pd.to_datetime(config["shift_time"]["A"][0]).time()
-        multiplier = 1 if to_foundry else -1
-
-        time_mask = data[col_name].dt.time < shift_cutoff
-
-        data["Datetime"] = data["datetime"] + pd.to_timedelta(time_mask.astype(int) * -1 * multiplier, unit='D')
-        return data
-    df_add = date_adjust(df_add,"datetime",True)
+    # Move early-morning readings onto the foundry day they belong to
+    shift_calendar = compile_shift_calendar(config["shift_time"])
+    df_add['Datetime'] = to_foundry_date(shift_calendar, df_add['datetime'])
 
 
 
@@ -138,63 +143,17 @@ def run_etl():
     midnight_crossings = prod_data['EndTime'] < prod_data['StartTime']
     prod_data.loc[midnight_crossings, 'EndTime'] += pd.Timedelta(days=1)
    
-    # Create a lookup dictionary for faster component_id lookups
-    component_ranges = []
-    for _, row in prod_data.iterrows():
-        component_ranges.append({
-            'start': row['StartTime'],
-            'end': row['EndTime'],
-            'component_id': row['component_id'],
-            'span_hours': (row['EndTime'] - row['StartTime']).total_seconds() / 3600
-        })
-   
-    @lru_cache(maxsize=1000)
-    def get_component_id(dt_str):
-        dt = pd.Timestamp(dt_str)
-        dt_next_day = dt + pd.Timedelta(days=1)
-       
-        # First try with the original datetime
-        for comp_range in component_ranges:
-            if comp_range['start'] <= dt <= comp_range['end']:
-                return comp_range['component_id']
-       
-        # For multi-day components, check next day
-        for comp_range in component_ranges:
-            if comp_range['span_hours'] > 12:  # Only check for long-running components
-                if comp_range['start'] <= dt_next_day <= comp_range['end']:
-                    return comp_range['component_id']
-       
-        return None
- 
-    # Apply the component lookup function
+    # Build the interval index once and resolve every batch in one vectorized pass
     print("Matching components to time ranges...")
-    matched_df['component_id'] = matched_df['datetime'].astype(str).apply(get_component_id)
+    component_index = build_component_index(prod_data)
+    matched_df['component_id'] = lookup_component_ids(component_index, matched_df['datetime'])
     matched_df['mixer_name'] = config['Mixer Name']
    
-    # Assign shift based on time
-    def assign_shift(row):
-        shift_a_start = datetime.strptime(config["shift_time"]["A"][0], "%H:%M:%S").time()
-        shift_b_start = datetime.strptime(config["shift_time"]["B"][0], "%H:%M:%S").time()
-       
-        if shift_a_start <= row.time() < shift_b_start:
-            return 'A'
-        else:
-            return 'B'
-   
-    matched_df['shift'] = matched_df['datetime'].apply(lambda dt: assign_shift(dt))
+    # Assign shift based on time, for every shift defined in config
+    matched_df['shift'] = assign_shifts(shift_calendar, matched_df['datetime'])
  
-    # Create the timestamp column properly accounting for shift
-    def compute_timestamp(row):
-        base_datetime = datetime.combine(row['date'], row['time'])
-       
-        # Adjust for B shift times after midnight
-        if row['shift'] == 'B' and row['time'] < datetime.strptime("07:00", "%H:%M").time():
-            return base_datetime + timedelta(days=1)  
-        else:
-            return base_datetime
- 
-    # Create the timestamp column
-    matched_df['timestamp'] = matched_df.apply(compute_timestamp, axis=1)
+    # Create the timestamp column from the SMC foundry datetime
+    matched_df['timestamp'] = to_wall_clock(shift_calendar, matched_df['Datetime'])
     
     # List of columns to select (excluding date and time, including timestamp)
     columns_to_select = [col for col in config["columns_to_select"] if col not in ['date', 'time']]
@@ -227,12 +186,20 @@ def run_etl():
     df.rename(columns=output_columns, inplace=True)
    
     # Filter out records that already exist in the database
+    upsert = config.get("bulk_write", {}).get("mode") == "upsert"
     if last_timestamp is not None:
-        new_records = df[df['timestamp'] > last_timestamp]
-        old_records = df[df['timestamp'] <= last_timestamp]
+        if upsert:
+            # Rewrite the overlap window too, so batches sharing the watermark second
+            # and late lab values are upserted instead of skipped
+            cutoff = last_timestamp - pd.Timedelta(minutes=config.get("upsert_overlap_minutes", 0))
+            keep = df['timestamp'] >= cutoff
+        else:
+            keep = df['timestamp'] > last_timestamp
+        new_records = df[keep]
+        old_records = df[~keep]
         print(f"Total records: {len(df)}")
         print(f"Records already in database: {len(old_records)}")
-        print(f"New records to insert: {len(new_records)}")
+        print(f"{'Records to upsert' if upsert else 'New records to insert'}: {len(new_records)}")
         df = new_records
     
     # If no new records, return empty dataframe with the latest timestamp
@@ -242,6 +209,9 @@ def run_etl():
     
     # Get the latest timestamp from the new records
     latest_timestamp = df['timestamp'].max()
+    if last_timestamp is not None and latest_timestamp <= last_timestamp:
+        # Only the overlap window was rewritten, the watermark stays where it is
+        latest_timestamp = None
     
     # Show sample data
     print("Sample of new data to be inserted:")
@@ -271,6 +241,9 @@ if __name__ == "__main__":
     # Create database engine for pandas
     engine = create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
     
+    # Bulk write settings for the report table
+    bulk_write = config.get("bulk_write", {"mode": "multi", "batch_size": 1000})
+
     # Create a direct pymysql connection for more efficient execution and transactions
     connection = pymysql.connect(
         host=DB_HOST,
@@ -278,12 +251,16 @@ if __name__ == "__main__":
         user=DB_USER,
         password=DB_PASSWORD,
         database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=bulk_write["mode"] == "load_data"
     )
     
     # Define target table
     target_table = "additive_report_dummy_rename_mcie"
    
+    # Row count and timestamp range the API reads for unfiltered requests
+    ensure_report_summary(target_table, connection)
+
     print("Starting ETL process...")
  
     # Main ETL loop
@@ -292,17 +269,16 @@ if __name__ == "__main__":
             current_time = datetime.now()
             print(f"Running ETL at {current_time}")
             try:
+                # Reopen the connection if the server dropped it between runs
+                connection.ping(reconnect=True)
                 # Run ETL process
                 df, latest_timestamp = run_etl(config, engine, connection, target_table)
                 
                 # Insert data to the correct table with timestamp column, but only if there are new records
                 if not df.empty:
                     print(f"Writing {len(df)} new records to table: {target_table}")
-                    df.to_sql(target_table, con=engine, if_exists='append', index=False)
-                    
-                    # Insert a new log entry with the latest timestamp
-                    if latest_timestamp:
-                        insert_logger_entry(connection, latest_timestamp)
+                    # Report rows and the new logger entry are committed together
+                    commit_etl_batch(connection, df, target_table, latest_timestamp, bulk_write)
                     
                     print("ETL process completed successfully.")
                 else:
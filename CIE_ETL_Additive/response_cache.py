@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """In-process LRU/TTL cache of serialized API responses.
+
+    Entries are dropped as soon as the ETL logger watermark moves, so a cached
+    page never outlives the data it was built from by more than one watermark
+    check. The TTL also bounds how long in-place corrections (upserts that do
+    not advance the watermark) can stay hidden.
+    """
+
+    def __init__(self, read_watermark, max_entries=256, ttl_seconds=300, watermark_check_seconds=5):
+        self.read_watermark = read_watermark
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.watermark_check_seconds = watermark_check_seconds
+        self._entries = OrderedDict()
+        self._watermark = None
+        self._watermark_checked_at = 0.0
+        # Wall-clock time this process first saw the current watermark, for Last-Modified
+        self.changed_at = None
+        self._lock = threading.Lock()
+
+    def watermark(self):
+        """Latest logger watermark, re-read from the DB at most every watermark_check_seconds"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._watermark_checked_at < self.watermark_check_seconds:
+                return self._watermark
+
+            watermark = self.read_watermark()
+            if watermark != self._watermark:
+                # The ETL committed new rows, everything cached so far is stale
+                self._entries.clear()
+                self._watermark = watermark
+                self.changed_at = time.time()
+            self._watermark_checked_at = now
+            return watermark
+
+    def get(self, key, watermark):
+        """Cached value for key built under watermark, or None when missing, expired or stale"""
+        self.watermark()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, stored_watermark, value = entry
+            if stored_watermark != watermark or stored_watermark != self._watermark:
+                return None
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value, watermark):
+        """Store value built under watermark, evicting the least recently used entry when full.
+
+        A value whose watermark was superseded while it was being built is
+        dropped, so an older body is never served under a newer watermark.
+        """
+        with self._lock:
+            if watermark != self._watermark:
+                return
+            self._entries[key] = (time.monotonic(), watermark, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 import pandas as pd
 import os
+import threading
 from datetime import datetime
 
 app = Flask(__name__)
@@ -8,31 +9,71 @@ app = Flask(__name__)
 # === Path to your Excel file ===
 EXCEL_FILE = r"C:\Users\MPM Infosoft\Downloads\Cadillac_ETL_Additive\data\processed_data.xlsx"
 
+# Parsed Excel data, kept in memory until the ETL rewrites the file
+_dataset = (None, None)
+_dataset_lock = threading.Lock()
+
+def load_dataset():
+    """Return the parsed dataset sorted by Date, re-reading the Excel file only when its mtime or size changes"""
+    global _dataset
+    stat = os.stat(EXCEL_FILE)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _dataset_lock:
+        cached_signature, cached_df = _dataset
+        if cached_signature == signature:
+            return cached_df
+        try:
+            df = pd.read_excel(EXCEL_FILE)
+        except Exception as e:
+            # The ETL may still be writing the file, keep serving the previous copy
+            if cached_df is not None:
+                print(f"Reload of {EXCEL_FILE} failed, serving cached data: {e}")
+                return cached_df
+            raise
+
+        # Ensure consistent column names (optional but safer)
+        df.columns = df.columns.str.strip()
+        if "Date" in df.columns:
+            df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+            df = df.sort_values("Date", kind="mergesort", na_position="last").reset_index(drop=True)
+        # Swap in the new copy in one assignment so readers never see a half-built frame
+        _dataset = (signature, df)
+        print(f"Loaded {len(df)} rows from {EXCEL_FILE}")
+        return df
+
+def date_slice(df, start_date, end_date):
+    """Rows between start_date and end_date, found by binary search on the sorted Date column"""
+    dates = df["Date"].to_numpy()
+    lo = 0
+    hi = int(df["Date"].notna().sum())
+    start = pd.to_datetime(start_date, errors='coerce') if start_date else None
+    end = pd.to_datetime(end_date, errors='coerce') if end_date else None
+    # An unparseable bound matches nothing, like the NaT comparison it replaces
+    if start is not None and pd.isna(start) or end is not None and pd.isna(end):
+        return df.iloc[0:0]
+    if start is not None:
+        lo = int(dates[:hi].searchsorted(start.to_datetime64(), side="left"))
+    if end is not None:
+        hi = int(dates[:hi].searchsorted(end.to_datetime64(), side="right"))
+    return df.iloc[lo:max(lo, hi)]
+
 @app.route('/api/cadilac-mixer-report', methods=['GET'])
 def get_excel_data():
     try:
         if not os.path.exists(EXCEL_FILE):
             return jsonify({"status": "error", "message": "Excel file not found."}), 404
 
-        df = pd.read_excel(EXCEL_FILE)
+        df = load_dataset()
 
         if df.empty:
             return jsonify({"status": "error", "message": "No data found in the Excel file."}), 404
 
-        # Ensure consistent column names (optional but safer)
-        df.columns = df.columns.str.strip()
-
-        # Optional date filtering
+        # Optional date filtering, an in-memory slice of the sorted dataset
         start_date = request.args.get("start_date")
         end_date = request.args.get("end_date")
 
-        if "Date" in df.columns:
-            df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-
-            if start_date:
-                df = df[df["Date"] >= pd.to_datetime(start_date, errors='coerce')]
-            if end_date:
-                df = df[df["Date"] <= pd.to_datetime(end_date, errors='coerce')]
+        if "Date" in df.columns and (start_date or end_date):
+            df = date_slice(df, start_date, end_date)
 
         # Pagination
         limit = int(request.args.get("limit", 100))
@@ -0,0 +1,123 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Bookings spanning more than this also match batches logged the day before
+NEXT_DAY_MIN_SPAN = pd.Timedelta(hours=12)
+
+
+def _to_ns(values) -> np.ndarray:
+    """Convert a datetime-like column to int64 nanoseconds (NaT becomes int64 min)"""
+    return pd.to_datetime(pd.Series(values)).to_numpy(dtype='datetime64[ns]').view('int64')
+
+
+def _build_interval_index(starts: np.ndarray, ends: np.ndarray, positions: np.ndarray):
+    """Paint closed [start, end] intervals onto elementary regions, lowest position wins"""
+    breakpoints = np.unique(np.concatenate([starts, ends]))
+
+    # Region 2*i is breakpoint i itself, region 2*i + 1 the open gap after it
+    owners = np.full(2 * len(breakpoints), -1, dtype=np.int64)
+    region_lo = 2 * np.searchsorted(breakpoints, starts)
+    region_hi = 2 * np.searchsorted(breakpoints, ends)
+
+    # Paint in reverse booking order so the first matching booking ends up on top
+    order = np.argsort(positions, kind='stable')[::-1]
+    for lo, hi, position in zip(region_lo[order], region_hi[order], positions[order]):
+        owners[lo:hi + 1] = position
+
+    return breakpoints, owners
+
+
+def _query_interval_index(breakpoints: np.ndarray, owners: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Return the owning booking position for every value, -1 where nothing matches"""
+    result = np.full(len(values), -1, dtype=np.int64)
+    if len(breakpoints) == 0:
+        return result
+
+    idx = np.searchsorted(breakpoints, values, side='right') - 1
+    valid = idx >= 0
+    exact = breakpoints[np.clip(idx, 0, None)] == values
+    region = 2 * idx + np.where(exact, 0, 1)
+    result[valid] = owners[region[valid]]
+    return result
+
+
+def build_component_index(prod_data: pd.DataFrame) -> dict:
+    """Normalize the consumption bookings once and build the component interval index.
+
+    Cross-midnight end times are moved to the next day. A booking longer than 12h
+    also matches a batch logged before its start if that batch falls inside the
+    booking one day later, so it is stored as a second, day-earlier interval.
+    """
+    starts = _to_ns(prod_data['StartTime'])
+    ends = _to_ns(prod_data['EndTime'])
+    nat = np.iinfo(np.int64).min
+    one_day = pd.Timedelta(days=1).value
+
+    usable = (starts != nat) & (ends != nat)
+    ends = np.where(usable & (ends < starts), ends + one_day, ends)
+    positions = np.flatnonzero(usable)
+
+    long_running = positions[(ends[positions] - starts[positions]) > NEXT_DAY_MIN_SPAN.value]
+    # Only batches strictly before the start take the next-day check
+    shifted_starts = starts[long_running] - one_day
+    shifted_ends = np.minimum(ends[long_running] - one_day, starts[long_running] - 1)
+
+    return {
+        'component_ids': prod_data['ComponentId'].to_numpy(dtype=object),
+        'intervals': _build_interval_index(
+            np.concatenate([starts[positions], shifted_starts]),
+            np.concatenate([ends[positions], shifted_ends]),
+            np.concatenate([positions, long_running]),
+        ),
+    }
+
+
+def lookup_component_ids(component_index: dict, datetimes: pd.Series) -> pd.Series:
+    """Label every datetime with its Component ID in one vectorized pass (first booking wins)"""
+    positions = _query_interval_index(*component_index['intervals'], _to_ns(datetimes))
+
+    component_ids = np.full(len(positions), None, dtype=object)
+    found = positions != -1
+    component_ids[found] = component_index['component_ids'][positions[found]]
+    return pd.Series(component_ids, index=datetimes.index, name='Component ID')
+
+
+def _legacy_get_component_id(dt, prod_data):
+    """The previous per-row lookup from etl.py, kept for the equivalence check"""
+    for _, row in prod_data.iterrows():
+        start = row['StartTime']
+        end = row['EndTime']
+        if end < start:
+            end += pd.Timedelta(days=1)
+        dt_check = dt
+        if dt < start and end - start > pd.Timedelta(hours=12):
+            dt_check += pd.Timedelta(days=1)
+
+        if start <= dt_check <= end:
+            return row['ComponentId']
+    return None
+
+
+def check_equivalence(data_dir: str) -> int:
+    """Compare the batch lookup with the legacy function on the exports in data_dir"""
+    for file in os.listdir(data_dir):
+        if file.startswith("Smc") and file.endswith(".xlsx"):
+            smc_df = pd.read_excel(os.path.join(data_dir, file), skiprows=5)
+        elif file.startswith("Consumption") and file.endswith(".xlsx"):
+            prod_data = pd.read_excel(os.path.join(data_dir, file), skiprows=5)
+
+    datetimes = pd.to_datetime(smc_df['Date'].astype(str) + " " + smc_df['Time'], format='%Y-%m-%d %H:%M')
+    prod_data['StartTime'] = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['StartTime'])
+    prod_data['EndTime'] = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['EndTime'])
+
+    expected = datetimes.apply(lambda dt: _legacy_get_component_id(dt, prod_data))
+    actual = lookup_component_ids(build_component_index(prod_data), datetimes)
+
+    mismatches = int((expected.fillna('<none>') != actual.fillna('<none>')).sum())
+    print(f"Batches: {len(datetimes)}, bookings: {len(prod_data)}, mismatches: {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    check_equivalence(os.path.join(os.getcwd(), "data"))
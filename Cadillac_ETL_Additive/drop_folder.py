@@ -0,0 +1,108 @@
+import json
+import os
+import time
+import traceback
+import pandas as pd
+
+
+def file_signature(path: str) -> list:
+    """(mtime_ns, size) of a file, as stored in the watch state"""
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_state(state_file: str) -> dict:
+    """Signatures of the exports already processed, keyed by file name"""
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file, "r") as f:
+        return json.load(f)
+
+
+def save_state(state_file: str, state: dict):
+    """Write the watch state through a temporary file so it is never left half written"""
+    temp_file = state_file + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(temp_file, state_file)
+
+
+def changed_exports(data_dir: str, patterns: list, state: dict) -> list:
+    """Files in data_dir matching any (prefix, extension) pattern that are new or changed since the last run"""
+    changed = []
+    for file in sorted(os.listdir(data_dir)):
+        if any(file.startswith(prefix) and file.endswith(extension) for prefix, extension in patterns):
+            if state.get(file) != file_signature(os.path.join(data_dir, file)):
+                changed.append(file)
+    return changed
+
+
+def row_keys(df: pd.DataFrame, key_columns: list) -> list:
+    """Row identities as tuples of strings, comparable between fresh frames and the re-read output"""
+    return list(zip(*[df[col].astype(str) for col in key_columns]))
+
+
+def append_rows(df: pd.DataFrame, output_file: str):
+    """Append df below the existing rows of the output workbook, creating it if needed"""
+    if not os.path.exists(output_file):
+        df.to_excel(output_file, index=False)
+        return
+    with pd.ExcelWriter(output_file, mode="a", engine="openpyxl", if_sheet_exists="overlay") as writer:
+        sheet_name = writer.book.sheetnames[0]
+        start_row = writer.book[sheet_name].max_row
+        df.to_excel(writer, sheet_name=sheet_name, index=False, header=False, startrow=start_row)
+
+
+def watch(data_dir: str, patterns: list, process_changed, output_file: str, key_columns: list,
+          poll_seconds: int = 60, state_file: str = "watch_state.json"):
+    """Poll data_dir and append the rows of new or changed exports to output_file.
+
+    process_changed(changed_files) returns the processed rows for those exports;
+    rows whose key_columns were already emitted are dropped before appending.
+    """
+    state = load_state(state_file)
+    columns = None
+    emitted = set()
+    if os.path.exists(output_file):
+        existing = pd.read_excel(output_file)
+        columns = list(existing.columns)
+        emitted = set(row_keys(existing, key_columns))
+    print(f"Watching {data_dir}, {len(emitted)} rows already in {output_file}")
+
+    try:
+        while True:
+            try:
+                changed = changed_exports(data_dir, patterns, state)
+                if changed:
+                    print(f"New or changed exports: {changed}")
+                    df = process_changed(changed)
+                    if columns is None:
+                        columns = list(df.columns)
+
+                    keys = row_keys(df, key_columns)
+                    new_keys = set()
+                    new_rows = []
+                    for position, key in enumerate(keys):
+                        if key not in emitted and key not in new_keys:
+                            new_keys.add(key)
+                            new_rows.append(position)
+                    df = df.iloc[new_rows].reindex(columns=columns)
+
+                    if len(df) > 0:
+                        append_rows(df, output_file)
+                    # Keys only count as emitted once the append went through; a failed
+                    # append (e.g. the workbook is open in Excel) is retried next poll
+                    emitted.update(new_keys)
+                    print(f"Appended {len(df)} new rows to {output_file}, skipped {len(keys) - len(df)} already emitted")
+
+                    # Only record the exports once their rows are safely in the output
+                    for file in changed:
+                        state[file] = file_signature(os.path.join(data_dir, file))
+                    save_state(state_file, state)
+            except Exception as e:
+                # A half-copied export fails to parse; it is retried on the next poll
+                print("Watch cycle failed:", e)
+                traceback.print_exc()
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("Watcher stopped by user.")
@@ -8,6 +8,12 @@ import matplotlib.pyplot as plt
 from typing import List, Tuple
 
 from datetime import datetime, timedelta
+
+from component_lookup import build_component_index, lookup_component_ids
+from shift_calendar import compile_shift_calendar, to_foundry_date, to_wall_clock
+from excel_cache import read_export
+from drop_folder import watch
+
 warnings.filterwarnings("ignore")
 
 cd=os.getcwd()
@@ -20,29 +26,8 @@ for file_name in os.listdir(config_dir):
             with open(file_path, "r") as config_file:
                 config = json.load(config_file)
 
-for file in os.listdir(data_dir):
-     if file.startswith("Smc") and file.endswith(".xlsx"):
-             file_path = os.path.join(data_dir, file)
-             smc_df = pd.read_excel(file_path,skiprows=5)
-     elif file.startswith("West") and file.endswith(".csv"):
-            file_path = os.path.join(data_dir, file)
-            df_add = pd.read_csv(file_path, on_bad_lines='skip')
-     elif file.startswith("Consumption") and file.endswith(".xlsx"):
-            file_path = os.path.join(data_dir, file)
-            prod_data = pd.read_excel(file_path, skiprows=5)
-
-df_add['datetime']=pd.to_datetime(df_add['process_date_time'],format='%Y-%m-%d %H:%M:%S')
-
-def date_adjust(data: pd.DataFrame, col_name: str, to_foundry: bool):
-    shift_cutoff = pd.to_datetime(config["shift_time"]["A"][0]).time()
-    multiplier = 1 if to_foundry else -1
-
-    time_mask = data[col_name].dt.time < shift_cutoff
-
-    data["Datetime"] = data["datetime"] + pd.to_timedelta(time_mask.astype(int) * -1 * multiplier, unit='D')
-    return data
-
-df_add = date_adjust(df_add,"datetime",True)
+# Move early-morning readings onto the foundry day they belong to
+shift_calendar = compile_shift_calendar(config["shift_time"])
 
 column_pairs = [
     ("bond_weight_sp", "bond_weight"),
@@ -71,7 +56,6 @@ def clean_actual_columns(df: pd.DataFrame, column_pairs: List[Tuple[str, str]])
 
     return df
 
-df_add=clean_actual_columns(df_add,column_pairs)
 
 
 def get_column_mapping(dict1):
@@ -80,7 +64,17 @@ def get_column_mapping(dict1):
         rename_dict[value] = key    
     return rename_dict
 rename_dict = get_column_mapping(config['columns_to_rename'])
-df_add.rename(columns = rename_dict,inplace =True)
+
+
+def load_additive_data(file_path):
+    """Read the mixer additive CSV and prepare it for matching"""
+    df_add = pd.read_csv(file_path, on_bad_lines='skip')
+    df_add['datetime']=pd.to_datetime(df_add['process_date_time'],format='%Y-%m-%d %H:%M:%S')
+    df_add['Datetime'] = to_foundry_date(shift_calendar, df_add['datetime'])
+
+    df_add=clean_actual_columns(df_add,column_pairs)
+    df_add.rename(columns = rename_dict,inplace =True)
+    return df_add.sort_values('Datetime')
 
 
 def smc_data_preprocessing(smc_df):
@@ -95,69 +89,107 @@ def smc_data_preprocessing(smc_df):
     return smc_df
 
 
-smc_df=smc_data_preprocessing(smc_df)
-
-
-df_add = df_add.sort_values('Datetime')
+def process_exports(smc_df, prod_data, df_add):
+    """Match one SMC export to the additive data and its consumption bookings"""
+    smc_df=smc_data_preprocessing(smc_df)
 
-matched_df =pd.merge_asof(
-    smc_df,
-    df_add,
-    on='Datetime',
-    direction='nearest',
-)
+    matched_df =pd.merge_asof(
+        smc_df,
+        df_add,
+        on='Datetime',
+        direction='nearest',
+    )
 
-matched_df=matched_df.sort_values(['Date','Time'])
+    matched_df=matched_df.sort_values(['Date','Time'])
 
-prod_data['StartTime'] = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['StartTime'])
+    prod_data['StartTime'] = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['StartTime'])
 
-prod_data['EndTime']   = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['EndTime'])
+    prod_data['EndTime']   = pd.to_datetime(prod_data['Date'].astype(str) + ' ' + prod_data['EndTime'])
 
-def get_component_id(dt):
-    for _, row in prod_data.iterrows():
-        start = row['StartTime']
-        end = row['EndTime']
-        if end < start:
-            end += pd.Timedelta(days=1)
-        dt_check = dt
-        if dt < start and end - start > pd.Timedelta(hours=12): 
-            dt_check += pd.Timedelta(days=1)
+    # Normalize cross-midnight and long-running bookings once, then label every batch in one pass
+    component_index = build_component_index(prod_data)
+    matched_df['Component ID'] = lookup_component_ids(component_index, matched_df['Datetime'])
 
-        if start <= dt_check <= end:
-            return row['ComponentId']
-    return None
 
+    matched_df['Mixer Name']=config['Mixer Name']
 
-matched_df['Component ID'] = matched_df['Datetime'].apply(get_component_id)
 
+    for col in config["columns_to_select"]:
+        if col not in matched_df.columns:
+            matched_df[col] = np.nan  # or use '' if you want empty strings
 
-matched_df['Mixer Name']=config['Mixer Name']
+    # Now select all columns as required
+    df = matched_df[config["columns_to_select"]]
 
 
-for col in config["columns_to_select"]:
-    if col not in matched_df.columns:
-        matched_df[col] = np.nan  # or use '' if you want empty strings
+    df['Date'] = pd.to_datetime(df['Date'],format='%Y-%m-%d')
+    df['Time'] = pd.to_datetime(df['Time'].astype(str)).dt.time
 
-# Now select all columns as required
-df = matched_df[config["columns_to_select"]]
+    df['ActualDateTime'] = to_wall_clock(shift_calendar, matched_df['Datetime'])
+    df['Date']=df['Date'].dt.date
+    df = df.sort_values(by=['ActualDateTime'])
+    df.drop(columns=['ActualDateTime'], errors='ignore', inplace=True)
 
+    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    return df
 
-df['Date'] = pd.to_datetime(df['Date'],format='%Y-%m-%d')
-df['Time'] = pd.to_datetime(df['Time'].astype(str)).dt.time
-
-def compute_actual_datetime(row):
-    base_datetime = datetime.combine(row['Date'], row['Time'])
-    
-    if row['Shift'] == 'B' and row['Time'] < datetime.strptime("07:00", "%H:%M").time():
-        return base_datetime + timedelta(days=1)  
-    else:
-        return base_datetime
-
-df['ActualDateTime'] = df.apply(compute_actual_datetime, axis=1)
-df['Date']=df['Date'].dt.date
-df = df.sort_values(by=['ActualDateTime'])
-df.drop(columns=['ActualDateTime'], errors='ignore', inplace=True)
-
-df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
 
-df.to_excel(os.path.join(data_dir, "processed_data.xlsx"), index=False)
+def read_data_dir():
+    """Load the SMC export, additive CSV and consumption bookings from data/"""
+    for file in os.listdir(data_dir):
+         if file.startswith("Smc") and file.endswith(".xlsx"):
+                 file_path = os.path.join(data_dir, file)
+                 smc_df = read_export(file_path,skiprows=5)
+         elif file.startswith("West") and file.endswith(".csv"):
+                file_path = os.path.join(data_dir, file)
+                df_add = load_additive_data(file_path)
+         elif file.startswith("Consumption") and file.endswith(".xlsx"):
+                file_path = os.path.join(data_dir, file)
+                prod_data = read_export(file_path, skiprows=5)
+    return smc_df, prod_data, df_add
+
+
+def watch_data_dir(watch_config):
+    """Append rows from SMC/consumption exports that land in data/ to processed_data.xlsx"""
+
+    def process_changed(changed):
+        # The additive CSV is shared by every export; a new copy reprocesses them all
+        add_files = sorted((f for f in os.listdir(data_dir) if f.startswith("West") and f.endswith(".csv")),
+                           key=lambda f: os.path.getmtime(os.path.join(data_dir, f)))
+        df_add = load_additive_data(os.path.join(data_dir, add_files[-1]))
+        reprocess_all = add_files[-1] in changed
+
+        smc_files = {f[len("Smc_"):-len(".xlsx")]: f for f in os.listdir(data_dir)
+                     if f.startswith("Smc_") and f.endswith(".xlsx")}
+        booking_files = {f[len("Consumptionbooking_"):-len(".xlsx")]: f for f in os.listdir(data_dir)
+                         if f.startswith("Consumptionbooking_") and f.endswith(".xlsx")}
+
+        frames = []
+        for key in sorted(set(smc_files) & set(booking_files)):
+            if reprocess_all or smc_files[key] in changed or booking_files[key] in changed:
+                smc_df = read_export(os.path.join(data_dir, smc_files[key]), skiprows=5)
+                prod_data = read_export(os.path.join(data_dir, booking_files[key]), skiprows=5)
+                frames.append(process_exports(smc_df, prod_data, df_add))
+        if not frames:
+            return pd.DataFrame(columns=config["columns_to_select"])
+        return pd.concat(frames, ignore_index=True)
+
+    watch(data_dir, [("Smc_", ".xlsx"), ("Consumptionbooking_", ".xlsx"), ("West", ".csv")], process_changed,
+          os.path.join(data_dir, "processed_data.xlsx"), ["Mixer Name", "Date", "Time", "Batch Counter"],
+          poll_seconds=watch_config.get("poll_seconds", 60),
+          state_file=watch_config.get("state_file", "watch_state.json"))
+
+
+def main():
+    watch_config = config.get("watch", {})
+    if watch_config.get("enabled", False):
+        watch_data_dir(watch_config)
+        return
+
+    smc_df, prod_data, df_add = read_data_dir()
+    df = process_exports(smc_df, prod_data, df_add)
+    df.to_excel(os.path.join(data_dir, "processed_data.xlsx"), index=False)
+
+
+if __name__ == "__main__":
+    main()
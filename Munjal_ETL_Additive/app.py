@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 import pandas as pd
 import os
+import threading
 from datetime import datetime
 
 app = Flask(__name__)
@@ -17,35 +18,73 @@ COLUMNS_TO_INCLUDE = [
     "Moisture SMC (%)", "WD1 (ltr)", "CO1 (%)"
 ]
 
+# Parsed Excel data, kept in memory until the ETL rewrites the file
+_dataset = (None, None)
+_dataset_lock = threading.Lock()
+
+def load_dataset():
+    """Return the parsed dataset sorted by Date, re-reading the Excel file only when its mtime or size changes"""
+    global _dataset
+    stat = os.stat(EXCEL_FILE)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _dataset_lock:
+        cached_signature, cached_df = _dataset
+        if cached_signature == signature:
+            return cached_df
+        try:
+            df = pd.read_excel(EXCEL_FILE)
+        except Exception as e:
+            # The ETL may still be writing the file, keep serving the previous copy
+            if cached_df is not None:
+                print(f"Reload of {EXCEL_FILE} failed, serving cached data: {e}")
+                return cached_df
+            raise
+        # Without a Date column the request handler reports the missing columns (400)
+        if "Date" in df.columns:
+            df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+            df = df.sort_values("Date", kind="mergesort", na_position="last").reset_index(drop=True)
+        # Swap in the new copy in one assignment so readers never see a half-built frame
+        _dataset = (signature, df)
+        print(f"Loaded {len(df)} rows from {EXCEL_FILE}")
+        return df
+
+def date_slice(df, start_date, end_date):
+    """Rows between start_date and end_date, found by binary search on the sorted Date column"""
+    if not start_date and not end_date:
+        return df
+    dates = df["Date"].to_numpy()
+    lo = 0
+    hi = int(df["Date"].notna().sum())
+    if start_date:
+        lo = int(dates[:hi].searchsorted(pd.to_datetime(start_date).to_datetime64(), side="left"))
+    if end_date:
+        hi = int(dates[:hi].searchsorted(pd.to_datetime(end_date).to_datetime64(), side="right"))
+    return df.iloc[lo:max(lo, hi)]
+
 @app.route('/api/munjal-mixer-report', methods=['GET'])
 def get_excel_data():
     try:
         if not os.path.exists(EXCEL_FILE):
             return jsonify({"status": "error", "message": "Excel file not found."}), 404
 
-        df = pd.read_excel(EXCEL_FILE)
+        df = load_dataset()
 
         # Check for missing columns
         missing = [col for col in COLUMNS_TO_INCLUDE if col not in df.columns]
         if missing:
             return jsonify({"status": "error", "message": f"Missing columns: {missing}"}), 400
 
-        df = df[COLUMNS_TO_INCLUDE]
-
-        # Optional date filtering — assumes Date is datetime
+        # Optional date filtering, an in-memory slice of the sorted dataset
         start_date = request.args.get("start_date")
         end_date = request.args.get("end_date")
-        if start_date:
-            df = df[df["Date"] >= pd.to_datetime(start_date)]
-        if end_date:
-            df = df[df["Date"] <= pd.to_datetime(end_date)]
+        df = date_slice(df, start_date, end_date)
 
         # Pagination
         limit = int(request.args.get("limit", 100))
         offset = int(request.args.get("offset", 0))
 
         total = len(df)
-        paginated = df.iloc[offset:offset + limit]
+        paginated = df.iloc[offset:offset + limit][COLUMNS_TO_INCLUDE].copy()
 
         # Convert date/time to string for JSON
         for col in ["Date", "Time"]:
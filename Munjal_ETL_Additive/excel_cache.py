@@ -0,0 +1,83 @@
+import hashlib
+import os
+import time
+import pandas as pd
+
+# Parsed exports live in this folder next to the source files
+CACHE_DIR_NAME = "_parquet_cache"
+
+
+def _content_hash(file_path: str) -> str:
+    """SHA-256 of the file contents, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as source:
+        for block in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(file_path: str, content_hash: str, skiprows: int) -> str:
+    """Sidecar Parquet path for one version of an export"""
+    cache_dir = os.path.join(os.path.dirname(file_path), CACHE_DIR_NAME)
+    return os.path.join(cache_dir, f"{os.path.basename(file_path)}.{skiprows}.{content_hash[:16]}.parquet")
+
+
+def _remove_stale_entries(file_path: str, skiprows: int, current_path: str):
+    """Delete cached versions of file_path read with skiprows whose content hash no longer matches"""
+    cache_dir = os.path.dirname(current_path)
+    prefix = f"{os.path.basename(file_path)}.{skiprows}."
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and name.endswith(".parquet") and path != current_path:
+            os.remove(path)
+
+
+def read_export(file_path: str, skiprows: int = 5) -> pd.DataFrame:
+    """read_excel(file_path, skiprows) through a content-hash keyed Parquet cache.
+
+    The first run parses the workbook and stores the typed frame as Parquet;
+    later runs load that copy until the workbook's contents change. Frames
+    Parquet cannot store (e.g. mixed-type columns) are simply not cached.
+    """
+    cache_path = _cache_path(file_path, _content_hash(file_path), skiprows)
+    if os.path.exists(cache_path):
+        try:
+            return pd.read_parquet(cache_path)
+        except Exception as e:
+            print(f"Ignoring unreadable cache {cache_path}: {e}")
+
+    df = pd.read_excel(file_path, skiprows=skiprows)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # Write under a temporary name first so a crash never leaves a truncated entry
+        temp_path = cache_path + ".tmp"
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, cache_path)
+        _remove_stale_entries(file_path, skiprows, cache_path)
+    except Exception as e:
+        print(f"Could not cache {os.path.basename(file_path)} as Parquet: {e}")
+    return df
+
+
+def benchmark(data_dir: str):
+    """Time read_excel against the cached read for every export in data_dir"""
+    for file in sorted(os.listdir(data_dir)):
+        if not file.endswith(".xlsx") or not file.startswith(("Smc", "Scada", "Consumption")):
+            continue
+        file_path = os.path.join(data_dir, file)
+
+        started = time.perf_counter()
+        expected = pd.read_excel(file_path, skiprows=5)
+        excel_seconds = time.perf_counter() - started
+
+        read_export(file_path)
+        started = time.perf_counter()
+        actual = read_export(file_path)
+        cached_seconds = time.perf_counter() - started
+
+        same = expected.equals(actual)
+        print(f"{file}: read_excel {excel_seconds:.2f}s, cached {cached_seconds * 1000:.1f}ms, identical: {same}")
+
+
+if __name__ == "__main__":
+    benchmark(os.path.join(os.getcwd(), "data"))
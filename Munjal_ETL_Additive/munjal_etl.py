@@ -6,8 +6,14 @@ import warnings
 import plotly.express as px
 import matplotlib.pyplot as plt
 from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
 
 from datetime import datetime, timedelta
+
+from shift_calendar import compile_shift_calendar, to_foundry_date, to_wall_clock
+from excel_cache import read_export
+from drop_folder import watch
+
 warnings.filterwarnings("ignore")
 
 cd=os.getcwd()
@@ -20,39 +26,26 @@ for file_name in os.listdir(config_dir):
             with open(file_path, "r") as config_file:
                 config = json.load(config_file)
 
-for file in os.listdir(data_dir):
-     if file.startswith("Smc") and file.endswith(".xlsx"):
-             file_path = os.path.join(data_dir, file)
-             smc_df = pd.read_excel(file_path,skiprows=5)
-     elif file.startswith("Scada") and file.endswith(".xlsx"):
-            file_path = os.path.join(data_dir, file)
-            scada_df = pd.read_excel(file_path,skiprows=5)
-
-
-
-scada_df['Datetime']=pd.to_datetime(scada_df['Date'].astype(str)
-+" "+ scada_df['Time'],format='%Y-%m-%d %H:%M')
-
-def date_adjust(data: pd.DataFrame, col_name: str, to_foundry: bool):
-    shift_cutoff = pd.to_datetime(config["shift_time"]["A"][0]).time()
-    multiplier = 1 if to_foundry else -1
-
-    time_mask = data[col_name].dt.time < shift_cutoff
-
-    data["Datetime"] = data["Datetime"] + pd.to_timedelta(time_mask.astype(int) * -1 * multiplier, unit='D')
-    return data
-
-scada_df= date_adjust(scada_df,"Datetime",True)
-
+# Move early-morning readings onto the foundry day they belong to
+shift_calendar = compile_shift_calendar(config["shift_time"])
 
 
 def get_column_mapping(dict1):
     rename_dict = {}
     for key,value in dict1.items():
-        rename_dict[value] = key    
+        rename_dict[value] = key
     return rename_dict
 rename_dict = get_column_mapping(config['columns_to_rename'])
-scada_df.rename(columns = rename_dict,inplace =True)
+
+
+def scada_data_preprocessing(scada_df):
+    scada_df['Datetime']=pd.to_datetime(scada_df['Date'].astype(str)
+    +" "+ scada_df['Time'],format='%Y-%m-%d %H:%M')
+
+    scada_df['Datetime'] = to_foundry_date(shift_calendar, scada_df['Datetime'])
+    scada_df.rename(columns = rename_dict,inplace =True)
+
+    return scada_df
 
 
 def smc_data_preprocessing(smc_df):
@@ -66,53 +59,147 @@ def smc_data_preprocessing(smc_df):
     return smc_df
 
 
-smc_df=smc_data_preprocessing(smc_df)
+def match_line(smc_df, scada_df, mixer_name):
+    """Match SMC batches to the next SCADA reading and shape them into the output columns"""
+    smc_df = smc_df.sort_values('Datetime')
+    scada_df = scada_df.sort_values('Datetime')
 
-smc_df = smc_df.sort_values('Datetime')
-scada_df = scada_df.sort_values('Datetime')
+    matched_df = pd.merge_asof(
+        smc_df,
+        scada_df,
+        on='Datetime',
+        direction='forward'
+    )
 
-matched_df = pd.merge_asof(
-    smc_df,
-    scada_df,
-    on='Datetime',
-    direction='forward'
-)
+    matched_df['Mixer Name']=mixer_name
 
-matched_df['Mixer Name']=config['Mixer Name']
+    matched_df['Water Actual']=matched_df['Total Water (ltr)']
+    matched_df.rename(columns={'Date_x': 'Date', 'Time_x': 'Time'}, inplace=True)
+    matched_df['Recycle sand Actual']=2500
 
-matched_df['Water Actual']=matched_df['Total Water (ltr)']
-matched_df.rename(columns={'Date_x': 'Date', 'Time_x': 'Time'}, inplace=True)
-matched_df['Recycle sand Actual']=2500
+    matched_df['Date'] = pd.to_datetime(matched_df['Date'],format='%Y-%m-%d')
+    matched_df['Time'] = pd.to_datetime(matched_df['Time'].astype(str)).dt.time
+    # Only the tail of the foundry day (before the first shift starts) moves to the next date
+    matched_df['timestamp'] = to_wall_clock(shift_calendar, matched_df['Datetime'])
+    matched_df = matched_df.sort_values(by=['timestamp'])
 
-matched_df['Date'] = pd.to_datetime(matched_df['Date'],format='%Y-%m-%d')
-matched_df['Time'] = pd.to_datetime(matched_df['Time'].astype(str)).dt.time
-def compute_actual_datetime(row):
-    base_date = row['Date']
-    time = row['Time']
-    shift = row['Shift']
-    base_datetime = datetime.combine(base_date, time)
+    #matched_df.to_excel("matched_data.xlsx", index=False)
+    df = matched_df[config["columns_to_select"]]
 
-    # Only shift date forward for early morning times
-    if shift == 'C' and time < datetime.strptime("07:00", "%H:%M").time() and time < datetime.strptime("23:00", "%H:%M").time():
-        return base_datetime + timedelta(days=1)
-    else:
-        return base_datetime
-    
-matched_df['timestamp'] = matched_df.apply(compute_actual_datetime, axis=1)
-matched_df = matched_df.sort_values(by=['timestamp'])
+    # Convert columns to appropriate data types
+    float_cols = df.select_dtypes(include=['float64']).columns
+    df[float_cols] = df[float_cols].round(2)
+
+    # Optional: Format Date before saving
+    df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+
+def process_line(smc_path, scada_path, mixer_name, line=None):
+    """Read, match and format one SMC/SCADA export pair, tagging the rows with their line"""
+    smc_df = smc_data_preprocessing(read_export(smc_path,skiprows=5))
+    scada_df = scada_data_preprocessing(read_export(scada_path,skiprows=5))
+
+    df = match_line(smc_df, scada_df, mixer_name)
+    if line is not None:
+        df.insert(df.columns.get_loc('Mixer Name') + 1, 'Line', line)
+    print(f"Processed {len(df)} batches for {line or mixer_name}")
+    return df
+
+
+def export_key(file_name, prefix):
+    """The part of an export name after its prefix, e.g. "01-Apr-2025_TO_01-Jun-2025_Disa 230C (Line1)" """
+    return os.path.splitext(file_name)[0][len(prefix):]
 
-#matched_df.to_excel("matched_data.xlsx", index=False)
-df = matched_df[config["columns_to_select"]]
 
-# Convert columns to appropriate data types 
-float_cols = df.select_dtypes(include=['float64']).columns
-df[float_cols] = df[float_cols].round(2)
+def line_name(key):
+    """Line from an export key: everything after "<from>_TO_<to>_" """
+    parts = key.split("_")
+    return "_".join(parts[3:]) if len(parts) > 3 and parts[1] == "TO" else key
 
-# Optional: Format Date before saving
-df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
-df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-print(df[['timestamp','Date']].head())
 
-df.to_excel("munjal_output.xlsx", index=False)
-print("Data processing complete. Output saved to 'munjal_output.xlsx'.")
+def pair_line_exports(smc_dir, scada_dir):
+    """Pair SMC and SCADA exports covering the same range and line, as (line, smc_path, scada_path)"""
+    smc_files = {export_key(f, "Smc_"): os.path.join(smc_dir, f)
+                 for f in os.listdir(smc_dir) if f.startswith("Smc_") and f.endswith(".xlsx")}
+    scada_files = {export_key(f, "Scada_"): os.path.join(scada_dir, f)
+                   for f in os.listdir(scada_dir) if f.startswith("Scada_") and f.endswith(".xlsx")}
 
+    for key in sorted(set(smc_files) ^ set(scada_files)):
+        print(f"Skipping {key}: no matching {'SCADA' if key in smc_files else 'SMC'} export")
+
+    return [(line_name(key), smc_files[key], scada_files[key]) for key in sorted(set(smc_files) & set(scada_files))]
+
+
+def run_multi_line(multi_line):
+    """Process every line's export pair in a process pool and write combined or per-line output"""
+    pairs = pair_line_exports(os.path.join(cd, multi_line.get("smc_dir", "smc_data")),
+                              os.path.join(cd, multi_line.get("scada_dir", "scada_data")))
+    line_mixers = multi_line.get("line_mixers", {})
+
+    with ProcessPoolExecutor(max_workers=multi_line.get("workers")) as pool:
+        futures = [pool.submit(process_line, smc_path, scada_path, line_mixers.get(line, config['Mixer Name']), line)
+                   for line, smc_path, scada_path in pairs]
+        results = [future.result() for future in futures]
+
+    if multi_line.get("output", "combined") == "per_line":
+        for (line, _, _), df in zip(pairs, results):
+            output_file = f"munjal_output_{line}.xlsx"
+            df.to_excel(output_file, index=False)
+            print(f"Output for {line} saved to '{output_file}'.")
+    else:
+        df = pd.concat(results, ignore_index=True).sort_values(by=['timestamp'], kind='mergesort')
+        df.to_excel("munjal_output.xlsx", index=False)
+        print(f"Data processing complete for {len(pairs)} lines. Output saved to 'munjal_output.xlsx'.")
+
+
+def watch_data_dir(watch_config):
+    """Append rows from SMC/SCADA exports that land in data/ to munjal_output.xlsx"""
+    multi_line = config.get("multi_line", {})
+    line_mixers = multi_line.get("line_mixers", {})
+
+    def process_changed(changed):
+        frames = []
+        for line, smc_path, scada_path in pair_line_exports(data_dir, data_dir):
+            if os.path.basename(smc_path) in changed or os.path.basename(scada_path) in changed:
+                mixer_name = line_mixers.get(line, config['Mixer Name'])
+                frames.append(process_line(smc_path, scada_path, mixer_name,
+                                           line if multi_line.get("enabled", False) else None))
+        if not frames:
+            return pd.DataFrame(columns=config["columns_to_select"])
+        return pd.concat(frames, ignore_index=True).sort_values(by=['timestamp'], kind='mergesort')
+
+    watch(data_dir, [("Smc_", ".xlsx"), ("Scada_", ".xlsx")], process_changed, "munjal_output.xlsx",
+          ["Mixer Name", "timestamp", "Batch Counter"],
+          poll_seconds=watch_config.get("poll_seconds", 60),
+          state_file=watch_config.get("state_file", "watch_state.json"))
+
+
+def main():
+    watch_config = config.get("watch", {})
+    if watch_config.get("enabled", False):
+        watch_data_dir(watch_config)
+        return
+
+    multi_line = config.get("multi_line", {})
+    if multi_line.get("enabled", False):
+        run_multi_line(multi_line)
+        return
+
+    for file in os.listdir(data_dir):
+         if file.startswith("Smc") and file.endswith(".xlsx"):
+                 smc_path = os.path.join(data_dir, file)
+         elif file.startswith("Scada") and file.endswith(".xlsx"):
+                scada_path = os.path.join(data_dir, file)
+
+    df = process_line(smc_path, scada_path, config['Mixer Name'])
+    print(df[['timestamp','Date']].head())
+
+    df.to_excel("munjal_output.xlsx", index=False)
+    print("Data processing complete. Output saved to 'munjal_output.xlsx'.")
+
+
+# Worker processes re-import this module, so the run itself stays behind the guard
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
+import base64
+import hashlib
 import json
 import os
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from sqlalchemy import create_engine
 import pandas as pd
-from datetime import datetime
+from contextlib import closing
+from datetime import datetime, timezone
+from response_cache import ResponseCache
+from report_json import fetch_records, dumps
+
+# Columnar formats need pyarrow, which only the analytics clients ask for
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 app = Flask(__name__)
 cd = os.getcwd()
@@ -23,73 +35,260 @@ DB_NAME = db_config["database_name"]
 # SQLAlchemy engine
 engine = create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
 
+# Logger table the ETL advances on every commit
+LOGGER_TABLE = "additive_report_dummy_logger_id"
+
+def read_watermark():
+    """Latest ETL logger entry as (id, last_timestamp), None while the logger is empty"""
+    watermark = pd.read_sql(f"SELECT id, last_timestamp FROM {LOGGER_TABLE} ORDER BY id DESC LIMIT 1", con=engine)
+    if len(watermark) == 0:
+        return None
+    return int(watermark.iloc[0]['id']), str(watermark.iloc[0]['last_timestamp'])
+
+# Serialized responses, flushed whenever the logger watermark advances
+response_cache = ResponseCache(read_watermark, **config.get("api_cache", {}))
+
+def watermark_validators(cache_key, watermark):
+    """ETag and Last-Modified for a request, derived from the ETL watermark and the query parameters"""
+    etag = hashlib.sha1(repr((watermark, cache_key)).encode()).hexdigest()
+    # In-place rewrites keep last_timestamp, so Last-Modified is when this process saw the
+    # watermark (logger id) change rather than the data watermark itself
+    changed_at = response_cache.changed_at
+    last_modified = datetime.fromtimestamp(changed_at, timezone.utc) if watermark and changed_at else None
+    return etag, last_modified
+
+def conditional_response(body, etag, last_modified, mimetype='application/json'):
+    """Response carrying the validators, turned into a 304 when the client copy is current"""
+    response = app.response_class(body, status=200, mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    return response.make_conditional(request)
+
+# Response formats besides JSON, served from the same page query
+COLUMNAR_MIMETYPES = {
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+def encode_columnar(df, metadata, response_format):
+    """Arrow IPC stream or Parquet bytes for df, with the response metadata kept in the schema"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    schema_metadata = dict(table.schema.metadata or {})
+    schema_metadata[b'report_metadata'] = json.dumps(metadata).encode()
+    table = table.replace_schema_metadata(schema_metadata)
+
+    sink = pa.BufferOutputStream()
+    if response_format == 'arrow':
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink)
+    return sink.getvalue().to_pybytes()
+
+def date_where_clause(start_date, end_date):
+    """WHERE clause restricting the report rows to the requested date range"""
+    if start_date and end_date:
+        return f"WHERE timestamp BETWEEN '{start_date}' AND '{end_date}'"
+    elif start_date:
+        return f"WHERE timestamp >= '{start_date}'"
+    elif end_date:
+        return f"WHERE timestamp <= '{end_date}'"
+    return ""
+
+def format_chunk(df):
+    """Convert datetime and timedelta columns to strings for the export formats"""
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_timedelta64_dtype(df[col]):
+            df[col] = df[col].astype(str)
+    return df
+
+# NULL key parts sort and seek as these values, matching the COALESCEs in the page query
+NULL_MIXER_NAME = ''
+NULL_BATCH_COUNTER = -1
+
+def encode_cursor(row):
+    """Opaque keyset cursor for the (timestamp, mixer_name, batch_counter) position of a row"""
+    mixer_name, batch_counter = row['mixer_name'], row['batch_counter']
+    position = json.dumps({'timestamp': str(pd.Timestamp(row['timestamp'])),
+                           'mixer_name': NULL_MIXER_NAME if mixer_name is None else str(mixer_name),
+                           'batch_counter': NULL_BATCH_COUNTER if batch_counter is None else int(batch_counter)})
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor):
+    """Parse a cursor from encode_cursor back into a (timestamp, mixer_name, batch_counter) tuple"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return pd.Timestamp(position['timestamp']), str(position['mixer_name']), int(position['batch_counter'])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def get_report_metadata(table_name, where_clause, include_total=True):
+    """Row count and timestamp range of the filtered report rows in a single query.
+
+    Unfiltered requests read the report_summary row the ETL refreshes on every
+    commit. With include_total=False the exact COUNT(*) is skipped and total is None.
+    """
+    if not where_clause:
+        try:
+            summary = pd.read_sql(
+                f"SELECT total_records as total, start_time, end_time FROM report_summary WHERE table_name = '{table_name}'",
+                con=engine
+            )
+            if len(summary) > 0:
+                return summary.iloc[0]
+        except Exception as e:
+            print(f"Report summary unavailable, falling back to a live query: {e}")
+
+    total_column = "COUNT(*)" if include_total else "NULL"
+    metadata_query = f"""
+        SELECT 
+            {total_column} as total,
+            MIN(timestamp) as start_time, 
+            MAX(timestamp) as end_time 
+        FROM {table_name}
+        {where_clause}
+    """
+    return pd.read_sql(metadata_query, con=engine).iloc[0]
+
 @app.route('/api/additive-report', methods=['GET'])
 def get_additive_report():
     try:
+        # Responses are keyed on the path and query parameters
+        cache_key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        # Unchanged pages cost one cached watermark lookup and no payload bytes
+        # Validators and cache entries are all tied to the watermark the request started with
+        watermark = response_cache.watermark()
+        etag, last_modified = watermark_validators(cache_key, watermark)
+        if request.if_none_match.contains(etag):
+            return conditional_response(b"", etag, last_modified)
+
+        # Identical polls between ETL commits are answered from memory
+        cached = response_cache.get(cache_key, watermark)
+        if cached is not None:
+            body, mimetype = cached
+            return conditional_response(body, etag, last_modified, mimetype)
+
         # Get query parameters for optional filtering
         limit = request.args.get('limit', default=100, type=int)
         offset = request.args.get('offset', default=0, type=int)
+        # Passing cursor (empty for the first page) switches to keyset pagination
+        cursor = request.args.get('cursor', default=None, type=str)
+        # include_total=false skips the exact row count on huge ranges
+        include_total = request.args.get('include_total', default='true', type=str).lower() != 'false'
         start_date = request.args.get('start_date', default=None, type=str)
         end_date = request.args.get('end_date', default=None, type=str)
+        # format=arrow or format=parquet returns the page as a columnar blob
+        response_format = request.args.get('format', default='json', type=str).lower()
+        if response_format != 'json' and response_format not in COLUMNAR_MIMETYPES:
+            return jsonify({'status': 'error', 'message': "format must be 'json', 'arrow' or 'parquet'"}), 400
+        if response_format in COLUMNAR_MIMETYPES and pa is None:
+            return jsonify({'status': 'error', 'message': "pyarrow is not installed on the server"}), 501
 
         # Build the WHERE clause for filtering by date range
-        where_clause = ""
-        if start_date and end_date:
-            where_clause = f"WHERE timestamp BETWEEN '{start_date}' AND '{end_date}'"
-        elif start_date:
-            where_clause = f"WHERE timestamp >= '{start_date}'"
-        elif end_date:
-            where_clause = f"WHERE timestamp <= '{end_date}'"
-
-        # Get total count
-        count_query = f"SELECT COUNT(*) as total FROM additive_report_dummy_rename {where_clause}"
-        total_records = pd.read_sql(count_query, con=engine).iloc[0]['total']
-
-        # Get min and max timestamps
-        time_range_query = f"""
-            SELECT 
-                MIN(timestamp) as start_time, 
-                MAX(timestamp) as end_time 
-            FROM additive_report_dummy_rename
-            {where_clause}
-        """
-        time_range = pd.read_sql(time_range_query, con=engine)
-        start_time = time_range.iloc[0]['start_time']
-        end_time = time_range.iloc[0]['end_time']
+        where_clause = date_where_clause(start_date, end_date)
+
+        # Count and timestamp range in one round trip
+        metadata = get_report_metadata("additive_report_dummy_rename", where_clause, include_total)
+        total_records = metadata['total']
+        start_time = metadata['start_time']
+        end_time = metadata['end_time']
 
         # Get the data with pagination
+        # A cursor seeks past the last row of the previous page (keyset pagination),
+        # so deep pages cost the same as the first; limit/offset still works without one
+        # The report tables have no id column, so ties on timestamp are broken by the
+        # (mixer_name, batch_counter) rest of the natural key; offset pages keep their old order
+        data_clause = where_clause
+        order_clause = "ORDER BY timestamp DESC"
+        page_clause = f"LIMIT {limit} OFFSET {offset}"
+        params = None
+        if cursor is not None:
+            order_clause = (f"ORDER BY timestamp DESC, COALESCE(mixer_name, '{NULL_MIXER_NAME}') DESC, "
+                            f"COALESCE(batch_counter, {NULL_BATCH_COUNTER}) DESC")
+            page_clause = f"LIMIT {limit}"
+        if cursor:
+            try:
+                cursor_timestamp, cursor_mixer, cursor_batch = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'status': 'error', 'message': str(e)}), 400
+            mixer_key = f"COALESCE(mixer_name, '{NULL_MIXER_NAME}')"
+            batch_key = f"COALESCE(batch_counter, {NULL_BATCH_COUNTER})"
+            seek = (f"(timestamp < '{cursor_timestamp}' OR (timestamp = '{cursor_timestamp}' AND "
+                    f"({mixer_key} < %s OR ({mixer_key} = %s AND {batch_key} < {cursor_batch}))))")
+            data_clause = f"{where_clause} AND {seek}" if where_clause else f"WHERE {seek}"
+            params = (cursor_mixer, cursor_mixer)
+
         data_query = f"""
-            SELECT * FROM additive_report_dummy_rename 
-            {where_clause}
-            ORDER BY timestamp DESC 
-            LIMIT {limit} OFFSET {offset}
+            SELECT * FROM additive_report_dummy_rename
+            {data_clause}
+            {order_clause}
+            {page_clause}
         """
-        df = pd.read_sql(data_query, con=engine)
-
-        # Convert all datetime and timedelta columns to string for JSON serialization
-        for col in df.columns:
-            if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_timedelta64_dtype(df[col]):
-                df[col] = df[col].astype(str)
-
-        # Prepare the response
-        data = df.to_dict(orient='records')
-        response = {
-            'status': 'success',
-            'metadata': {
-                'total_records': int(total_records),
-                'start_time': str(start_time),
-                'end_time': str(end_time),
-                'limit': limit,
-                'offset': offset
-            },
-            'data': data
+        # Rows come straight off a DB-API cursor, pandas is only used for columnar formats
+        with closing(engine.raw_connection()) as connection:
+            records = fetch_records(connection, data_query, params)
+
+        response_metadata = {
+            'total_records': int(total_records) if pd.notna(total_records) else None,
+            'start_time': str(start_time),
+            'end_time': str(end_time),
+            'limit': limit
         }
-        return jsonify(response), 200
+        # offset is ignored in cursor mode, so only the mode in use is echoed
+        if cursor is not None:
+            response_metadata['cursor'] = cursor
+            # Position of the last row, only when another page may follow
+            full_page = len(records) == limit and len(records) > 0
+            response_metadata['next_cursor'] = encode_cursor(records[-1]) if full_page else None
+        else:
+            response_metadata['offset'] = offset
+        if response_format in COLUMNAR_MIMETYPES:
+            # Native column types go straight into Arrow, no JSON round trip
+            body = encode_columnar(pd.DataFrame.from_records(records), response_metadata, response_format)
+            mimetype = COLUMNAR_MIMETYPES[response_format]
+        else:
+            # Datetimes, timedeltas, Decimals and NaN are handled by the encoder
+            response = {
+                'status': 'success',
+                'metadata': response_metadata,
+                'data': records
+            }
+            body = dumps(response)
+            mimetype = 'application/json'
+        response_cache.put(cache_key, (body, mimetype), watermark)
+        return conditional_response(body, etag, last_modified, mimetype)
     except Exception as e:
         import traceback
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/api/additive-report/export', methods=['GET'])
+def export_additive_report():
+    """Stream the whole date range as NDJSON or CSV without holding it in memory"""
+    export_format = request.args.get('format', default='ndjson', type=str).lower()
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'status': 'error', 'message': "format must be 'ndjson' or 'csv'"}), 400
+
+    where_clause = date_where_clause(request.args.get('start_date', default=None, type=str),
+                                     request.args.get('end_date', default=None, type=str))
+    chunk_size = config.get("export_chunk_size", 5000)
+    export_query = f"SELECT * FROM additive_report_dummy_rename {where_clause} ORDER BY timestamp"
+
+    def generate():
+        # stream_results makes pymysql use a server-side (unbuffered) cursor
+        with engine.connect().execution_options(stream_results=True) as connection:
+            for number, chunk in enumerate(pd.read_sql(export_query, con=connection, chunksize=chunk_size)):
+                chunk = format_chunk(chunk)
+                if export_format == 'csv':
+                    yield chunk.to_csv(index=False, header=number == 0)
+                else:
+                    yield chunk.to_json(orient='records', lines=True).rstrip("\n") + "\n"
+
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f"attachment; filename=additive_report_dummy_rename.{export_format}"
+    return response
+
 if __name__ == "__main__":
     print(f"Starting API server at {datetime.now()}")
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pymysql
+from sqlalchemy import create_engine
+from bulk_writer import write_report_rows, update_report_summary
+from etl import load_day_window, transform_source_data
+from shift_calendar import compile_shift_calendar
+
+# Logger table the API derives its cache watermark and ETags from
+LOGGER_TABLE = "additive_report_dummy_logger_id"
+
+# Engine of the current worker process, created once by init_worker
+worker_engine = None
+
+
+def engine_url(db_config):
+    """SQLAlchemy URL for the database block from config.json"""
+    return (f"mysql+pymysql://{db_config['user']}:{db_config['password']}"
+            f"@{db_config['host']}:{db_config['port']}/{db_config['database_name']}")
+
+
+def init_worker(db_config):
+    """Give each worker process its own connection pool"""
+    global worker_engine
+    worker_engine = create_engine(engine_url(db_config))
+
+
+def list_partitions(config, start_date, end_date, partition):
+    """(day, shift) partitions in time order; shift is None for whole-day partitions.
+
+    Partitions never split a Batch_reset group, so batch_counter comes out the
+    same as in a single run over the whole range.
+    """
+    if partition == "shift" and "shift" not in config["Batch_reset"]:
+        print("Batch_reset does not group by shift, using day partitions instead")
+        partition = "day"
+
+    # Every day and configured shift of the range, so stored rows of partitions that lost
+    # their SMC data are cleared too
+    days = pd.date_range(start_date, end_date, freq="D").date
+    if partition == "day":
+        return [(day, None) for day in days]
+
+    # Shifts of a day in foundry-day order, starting with the first shift
+    shifts = sorted(config["shift_time"], key=lambda shift: partition_bounds(config, days[0], shift)[0]) if len(days) else []
+    return [(day, shift) for day in days for shift in shifts]
+
+
+def partition_bounds(config, day, shift):
+    """Wall-clock [start, end) of a partition's report rows under the configured shift times"""
+    one_day = pd.Timedelta(days=1)
+    first_shift_start = pd.Timedelta(seconds=compile_shift_calendar(config["shift_time"])['first_shift_start'])
+    # A foundry day runs from the first shift start to the same time on the next calendar day
+    day_start = pd.Timestamp(day) + first_shift_start
+    if shift is None:
+        return day_start, day_start + one_day
+
+    shift_start, shift_end = (pd.Timedelta(clock) for clock in config["shift_time"][shift])
+    start = day_start + (shift_start - first_shift_start) % one_day
+    return start, start + ((shift_end - shift_start) % one_day or one_day)
+
+
+def process_partition(config, day, shift):
+    """Run the merge/clean/lookup pipeline for one partition in a worker process"""
+    smc_df, df_add, prod_data = load_day_window(config, worker_engine, day)
+    if shift is not None:
+        smc_df = smc_df[smc_df['shift'] == shift]
+    if smc_df.empty:
+        return smc_df
+    return transform_source_data(config, smc_df, df_add, prod_data)
+
+
+def replace_partition(connection, df, target_table, mixer_name, bounds, bulk_write):
+    """Swap the stored rows of a partition for the recomputed ones in one transaction and one bulk load.
+
+    Everything the mixer has stored within the partition's bounds is deleted,
+    also when the partition now recomputes to no rows.
+    """
+    start, end = bounds
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {target_table} WHERE mixer_name = %s AND timestamp >= %s AND timestamp < %s",
+                (mixer_name, start.to_pydatetime(), end.to_pydatetime())
+            )
+            deleted = cursor.rowcount
+        update_report_summary(target_table, connection, -deleted)
+        if not df.empty:
+            write_report_rows(df, target_table, connection, bulk_write)
+        if deleted or not df.empty:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT last_timestamp FROM {LOGGER_TABLE} ORDER BY id DESC LIMIT 1")
+                latest = cursor.fetchone()
+                # An empty logger stays empty, the live ETL then starts from scratch as before
+                if latest is not None and latest[0] is not None:
+                    # A new logger id invalidates the API caches and ETags. The watermark moves up to the
+                    # newest rewritten row, so the live ETL does not insert rows past it a second time
+                    watermark = pd.Timestamp(latest[0])
+                    if not df.empty:
+                        watermark = max(watermark, pd.Timestamp(df['timestamp'].max()))
+                    cursor.execute(f"INSERT INTO {LOGGER_TABLE} (last_timestamp) VALUES (%s)",
+                                   (watermark.to_pydatetime(),))
+        connection.commit()
+        return deleted
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def run_backfill(config, start_date, end_date, partition="day", workers=None, target_table="additive_report_dummy_rename"):
+    """Recompute the report rows between start_date and end_date across a process pool"""
+    db_config = config["database"]
+    partitions = list_partitions(config, start_date, end_date, partition)
+    workers = workers or os.cpu_count()
+    print(f"Backfilling {len(partitions)} partitions from {start_date} to {end_date} with {workers} workers")
+
+    bulk_write = config.get("bulk_write", {"mode": "multi", "batch_size": 1000})
+    connection = pymysql.connect(
+        host=db_config["host"],
+        port=int(db_config["port"]),
+        user=db_config["user"],
+        password=db_config["password"],
+        database=db_config["database_name"],
+        local_infile=bulk_write["mode"] == "load_data"
+    )
+
+    started = time.perf_counter()
+    rows = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(db_config,)) as pool:
+            # Keep a bounded number of partitions in flight and write them back in time order
+            pending = deque()
+            remaining = iter(partitions)
+            for day, shift in remaining:
+                pending.append(((day, shift), pool.submit(process_partition, config, day, shift)))
+                if len(pending) >= 2 * workers:
+                    break
+            while pending:
+                (day, shift), future = pending.popleft()
+                df = future.result()
+                deleted = replace_partition(connection, df, target_table, config['Mixer Name'],
+                                            partition_bounds(config, day, shift), bulk_write)
+                rows += len(df)
+                print(f"Partition {day}{' ' + shift if shift else ''}: {deleted} rows replaced by {len(df)}")
+
+                next_partition = next(remaining, None)
+                if next_partition is not None:
+                    pending.append((next_partition, pool.submit(process_partition, config, *next_partition)))
+    finally:
+        connection.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Backfill complete: {rows} rows in {elapsed:.2f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute additive report rows for a date range in parallel")
+    parser.add_argument("start_date", help="first SMC date to recompute (YYYY-MM-DD)")
+    parser.add_argument("end_date", help="last SMC date to recompute (YYYY-MM-DD)")
+    parser.add_argument("--partition", choices=["day", "shift"], help="overrides parallel_backfill.partition")
+    parser.add_argument("--workers", type=int, help="overrides parallel_backfill.workers (default: all cores)")
+    args = parser.parse_args()
+
+    config_file_path = os.path.join(os.getcwd(), "config", "config.json")
+    with open(config_file_path, "r") as config_file:
+        config = json.load(config_file)
+
+    parallel_backfill = config.get("parallel_backfill", {})
+    run_backfill(config, args.start_date, args.end_date,
+                 partition=args.partition or parallel_backfill.get("partition", "day"),
+                 workers=args.workers or parallel_backfill.get("workers"))
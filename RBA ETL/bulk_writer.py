@@ -0,0 +1,324 @@
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+import numpy as np
+import pandas as pd
+
+# Natural key of a report row, used by the upsert mode
+DEFAULT_UPSERT_KEYS = ("mixer_name", "timestamp", "batch_counter")
+
+# One row per report table with its row count and timestamp range, read by app.py
+SUMMARY_TABLE = "report_summary"
+
+
+def _placeholder(connection) -> str:
+    """DB-API placeholder for the connection (pymysql uses %s, sqlite3 uses ?)"""
+    return "?" if isinstance(connection, sqlite3.Connection) else "%s"
+
+
+def _column_values(series: pd.Series) -> list:
+    """Convert a column to plain Python values the DB drivers can bind, NaN/NaT as None"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = np.array(series.dt.to_pydatetime(), dtype=object)
+    elif pd.api.types.is_timedelta64_dtype(series):
+        values = np.array(series.dt.to_pytimedelta(), dtype=object)
+    else:
+        values = series.to_numpy(dtype=object)
+    values[series.isna().to_numpy()] = None
+    return values.tolist()
+
+
+def _batches(df: pd.DataFrame, batch_size: int):
+    """Yield consecutive slices of at most batch_size rows"""
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def write_multi_values(df: pd.DataFrame, target_table: str, connection, batch_size: int, **options) -> int:
+    """Insert rows in batches of multi-row INSERT ... VALUES statements.
+
+    pymysql folds each executemany batch into a single multi-row VALUES statement.
+    """
+    return _execute_batches(df, _insert_sql(df, target_table, connection), connection, batch_size)
+
+
+def _insert_sql(df: pd.DataFrame, target_table: str, connection) -> str:
+    """INSERT statement with one placeholder per column"""
+    columns = ", ".join(f"`{col}`" for col in df.columns)
+    placeholders = ", ".join([_placeholder(connection)] * len(df.columns))
+    return f"INSERT INTO `{target_table}` ({columns}) VALUES ({placeholders})"
+
+
+def _execute_batches(df: pd.DataFrame, sql: str, connection, batch_size: int, stats: dict = None) -> int:
+    """Run sql through executemany for each batch of rows, summing affected rows into stats if given"""
+    written = 0
+    with closing(connection.cursor()) as cursor:
+        for batch in _batches(df, batch_size):
+            rows = list(zip(*[_column_values(batch[col]) for col in batch.columns]))
+            cursor.executemany(sql, rows)
+            written += len(rows)
+            if stats is not None:
+                stats['affected'] = stats.get('affected', 0) + max(cursor.rowcount, 0)
+    return written
+
+
+def write_upsert(df: pd.DataFrame, target_table: str, connection, batch_size: int,
+                 upsert_keys=DEFAULT_UPSERT_KEYS, stats: dict = None, **options) -> int:
+    """Insert rows in batches, updating rows whose upsert_keys already exist.
+
+    Uses INSERT ... ON DUPLICATE KEY UPDATE on MySQL (the target table needs a
+    unique key over upsert_keys) and ON CONFLICT ... DO UPDATE on SQLite.
+    stats['affected'] receives the affected row count; MySQL does not count
+    rows an update left unchanged.
+    """
+    missing = [key for key in upsert_keys if key not in df.columns]
+    if missing:
+        raise ValueError(f"Upsert key columns missing from the frame: {missing}")
+
+    update_columns = [col for col in df.columns if col not in upsert_keys] or list(upsert_keys[:1])
+    sql = _insert_sql(df, target_table, connection)
+    if isinstance(connection, sqlite3.Connection):
+        keys = ", ".join(f"`{key}`" for key in upsert_keys)
+        updates = ", ".join(f"`{col}` = excluded.`{col}`" for col in update_columns)
+        sql += f" ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+    else:
+        updates = ", ".join(f"`{col}` = VALUES(`{col}`)" for col in update_columns)
+        sql += f" ON DUPLICATE KEY UPDATE {updates}"
+
+    return _execute_batches(df, sql, connection, batch_size, stats)
+
+
+def write_load_data(df: pd.DataFrame, target_table: str, connection, batch_size: int, **options) -> int:
+    """Stream rows through LOAD DATA LOCAL INFILE, one temporary CSV file per batch.
+
+    The pymysql connection must be opened with local_infile=True.
+    """
+    if isinstance(connection, sqlite3.Connection):
+        raise ValueError("LOAD DATA LOCAL INFILE mode needs a MySQL connection")
+
+    columns = ", ".join(f"`{col}`" for col in df.columns)
+    written = 0
+    with closing(connection.cursor()) as cursor:
+        for batch in _batches(df, batch_size):
+            with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False, newline="") as csv_file:
+                batch.to_csv(csv_file, index=False, header=False, na_rep="\\N",
+                             date_format="%Y-%m-%d %H:%M:%S", lineterminator="\n")
+            try:
+                cursor.execute(
+                    f"LOAD DATA LOCAL INFILE %s INTO TABLE `{target_table}` "
+                    "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+                    f"LINES TERMINATED BY '\\n' ({columns})",
+                    (csv_file.name,)
+                )
+            finally:
+                os.remove(csv_file.name)
+            written += len(batch)
+    return written
+
+
+# Write modes selectable through config["bulk_write"]["mode"]
+SINKS = {
+    "multi": write_multi_values,
+    "upsert": write_upsert,
+    "load_data": write_load_data,
+}
+
+
+def write_frame(df: pd.DataFrame, target_table: str, connection, mode: str = "multi", batch_size: int = 1000,
+                **options) -> int:
+    """Write df to target_table through the selected bulk sink and report rows/sec.
+
+    Extra options (such as upsert_keys) are passed on to the sink. Does not
+    commit, so the caller decides the transaction boundary.
+    """
+    if mode not in SINKS:
+        raise ValueError(f"Unknown bulk write mode '{mode}', expected one of {sorted(SINKS)}")
+
+    started = time.perf_counter()
+    written = SINKS[mode](df, target_table, connection, batch_size, **options)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {written} rows to {target_table} in {elapsed:.2f}s "
+          f"({written / max(elapsed, 1e-9):,.0f} rows/s, {mode} mode, batch size {batch_size})")
+    return written
+
+
+def _first_value(row):
+    """First column of a fetched row, from tuple and dict cursors alike"""
+    return next(iter(row.values())) if isinstance(row, dict) else row[0]
+
+
+def _to_datetime(value):
+    """Plain datetime for binding, None for missing values"""
+    return None if value is None or pd.isna(value) else pd.Timestamp(value).to_pydatetime()
+
+
+def ensure_report_summary(target_table: str, connection, summary_table: str = SUMMARY_TABLE) -> None:
+    """Create the summary table if needed and seed target_table's row with one full count.
+
+    Meant for ETL startup, outside any write transaction (CREATE TABLE commits
+    implicitly on MySQL). Failures are only logged; app.py then keeps using
+    live queries.
+    """
+    p = _placeholder(connection)
+    try:
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS `{summary_table}` (table_name VARCHAR(64) PRIMARY KEY, "
+                "total_records BIGINT NOT NULL, start_time DATETIME NULL, end_time DATETIME NULL)"
+            )
+            cursor.execute(f"SELECT COUNT(*) FROM `{summary_table}` WHERE table_name = {p}", (target_table,))
+            if _first_value(cursor.fetchone()) == 0:
+                cursor.execute(
+                    f"INSERT INTO `{summary_table}` (table_name, total_records, start_time, end_time) "
+                    f"SELECT {p}, COUNT(*), MIN(`timestamp`), MAX(`timestamp`) FROM `{target_table}`",
+                    (target_table,)
+                )
+        connection.commit()
+    except Exception as e:
+        connection.rollback()
+        print(f"Report summary for {target_table} unavailable: {e}")
+
+
+def count_rows_between(target_table: str, connection, start_time, end_time) -> int:
+    """Rows of target_table with a timestamp in [start_time, end_time]"""
+    p = _placeholder(connection)
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM `{target_table}` WHERE `timestamp` BETWEEN {p} AND {p}",
+            (_to_datetime(start_time), _to_datetime(end_time))
+        )
+        return int(_first_value(cursor.fetchone()))
+
+
+def update_report_summary(target_table: str, connection, added_rows: int, start_time=None, end_time=None,
+                          summary_table: str = SUMMARY_TABLE) -> None:
+    """Apply a write to target_table's summary row without rescanning the report table.
+
+    Runs in a savepoint of the caller's transaction, so a missing summary table
+    is logged and never rolls back the report rows. A missing summary row stays
+    missing until ensure_report_summary seeds it.
+    """
+    p = _placeholder(connection)
+    start_time, end_time = _to_datetime(start_time), _to_datetime(end_time)
+    with closing(connection.cursor()) as cursor:
+        cursor.execute("SAVEPOINT report_summary")
+        try:
+            cursor.execute(
+                f"UPDATE `{summary_table}` SET total_records = total_records + {p}, "
+                f"start_time = COALESCE(CASE WHEN start_time <= {p} THEN start_time END, {p}, start_time), "
+                f"end_time = COALESCE(CASE WHEN end_time >= {p} THEN end_time END, {p}, end_time) "
+                f"WHERE table_name = {p}",
+                (int(added_rows), start_time, start_time, end_time, end_time, target_table)
+            )
+            cursor.execute("RELEASE SAVEPOINT report_summary")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT report_summary")
+            print(f"Report summary for {target_table} not updated: {e}")
+
+
+def write_report_rows(df: pd.DataFrame, target_table: str, connection, bulk_write: dict) -> int:
+    """write_frame plus the matching summary update, both in the caller's transaction.
+
+    Returns the number of rows the write changed: every row for the insert
+    modes, only inserted or actually modified rows for upserts.
+    """
+    start_time, end_time = df['timestamp'].min(), df['timestamp'].max()
+    # Upserts may rewrite rows that already exist, so only the net growth of the written window counts
+    upsert = bulk_write.get("mode") == "upsert"
+    before = count_rows_between(target_table, connection, start_time, end_time) if upsert else 0
+    stats = {}
+    written = write_frame(df, target_table, connection, **bulk_write, **({"stats": stats} if upsert else {}))
+    added = count_rows_between(target_table, connection, start_time, end_time) - before if upsert else written
+    update_report_summary(target_table, connection, added, start_time, end_time)
+    return stats.get('affected', 0) if upsert else written
+
+
+def benchmark(rows: int = 100_000, batch_size: int = 1000):
+    """Write a synthetic report frame into an in-memory SQLite stand-in"""
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2025-05-01 07:00:00') + pd.to_timedelta(np.arange(rows), unit='min'),
+        'mixer_name': 'Mixer 1',
+        'batch_counter': np.arange(rows) % 500 + 1,
+        'recycle_sand_actual': rng.uniform(2000, 3000, rows),
+        'moisture_smc_pct': np.where(rng.random(rows) < 0.05, np.nan, rng.uniform(1, 5, rows)),
+    })
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE additive_report_dummy_rename "
+        "(timestamp TEXT, mixer_name TEXT, batch_counter INTEGER, recycle_sand_actual REAL, moisture_smc_pct REAL)"
+    )
+    written = write_frame(df, "additive_report_dummy_rename", connection, mode="multi", batch_size=batch_size)
+    connection.commit()
+
+    stored = connection.execute("SELECT COUNT(*) FROM additive_report_dummy_rename").fetchone()[0]
+    print(f"Rows in SQLite stand-in: {stored}")
+    connection.close()
+    return written == stored == rows
+
+
+def check_upsert(rows: int = 10_000, overlap: int = 2_000):
+    """Rewrite an overlapping window in upsert mode and confirm no duplicates appear"""
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2025-05-01 07:00:00') + pd.to_timedelta(np.arange(rows), unit='min'),
+        'mixer_name': 'Mixer 1',
+        'batch_counter': np.arange(rows) + 1,
+        'moisture_smc_pct': 1.0,
+    })
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE additive_report_dummy_rename (timestamp TEXT, mixer_name TEXT, batch_counter INTEGER, "
+        "moisture_smc_pct REAL, UNIQUE (mixer_name, timestamp, batch_counter))"
+    )
+    write_frame(df, "additive_report_dummy_rename", connection, mode="upsert")
+
+    # Late lab values arrive for the last rows of the window
+    late = df.iloc[-overlap:].assign(moisture_smc_pct=2.0)
+    write_frame(late, "additive_report_dummy_rename", connection, mode="upsert")
+    connection.commit()
+
+    stored, corrected = connection.execute(
+        "SELECT COUNT(*), SUM(moisture_smc_pct = 2.0) FROM additive_report_dummy_rename"
+    ).fetchone()
+    print(f"Rows after overlapping upsert: {stored}, corrected: {corrected}")
+    connection.close()
+    return stored == rows and corrected == overlap
+
+
+def check_report_summary(rows: int = 1_000, overlap: int = 200):
+    """Keep the summary in step with inserts and upserts, and survive a missing summary table"""
+    df = pd.DataFrame({
+        'timestamp': pd.Timestamp('2025-05-01 07:00:00') + pd.to_timedelta(np.arange(rows), unit='min'),
+        'mixer_name': 'Mixer 1',
+        'batch_counter': np.arange(rows) + 1,
+    })
+
+    connection = sqlite3.connect(":memory:")
+    connection.execute(
+        "CREATE TABLE additive_report_dummy_rename (timestamp TIMESTAMP, mixer_name TEXT, batch_counter INTEGER, "
+        "UNIQUE (mixer_name, timestamp, batch_counter))"
+    )
+    # Without the summary table the report rows are still written
+    write_report_rows(df.iloc[:overlap], "additive_report_dummy_rename", connection, {"mode": "multi"})
+    connection.commit()
+    ensure_report_summary("additive_report_dummy_rename", connection)
+
+    write_report_rows(df.iloc[overlap:], "additive_report_dummy_rename", connection, {"mode": "multi"})
+    write_report_rows(df.iloc[-overlap:], "additive_report_dummy_rename", connection, {"mode": "upsert"})
+    connection.commit()
+
+    summary = connection.execute(f"SELECT total_records FROM {SUMMARY_TABLE}").fetchone()[0]
+    stored = connection.execute("SELECT COUNT(*) FROM additive_report_dummy_rename").fetchone()[0]
+    print(f"Summary total: {summary}, rows stored: {stored}")
+    connection.close()
+    return summary == stored == rows
+
+
+if __name__ == "__main__":
+    benchmark()
+    check_upsert()
+    check_report_summary()
@@ -0,0 +1,50 @@
+import json
+import os
+from datetime import datetime
+from sqlalchemy import create_engine
+from table_sync import fan_out_sync
+
+
+def mysql_engine(db_config):
+    """SQLAlchemy engine for a database block from config.json"""
+    return create_engine(
+        f"mysql+pymysql://{db_config['user']}:{db_config['password']}@{db_config['host']}:{db_config['port']}/{db_config['database_name']}"
+    )
+
+
+def target_database(target):
+    """Database block of a replication target, read from the target's own config.
+
+    REPLICATION_<NAME>_USER / _PASSWORD environment variables override the
+    credentials, so no target password has to be copied into this folder.
+    """
+    with open(target["config"], "r") as config_file:
+        db_config = dict(json.load(config_file)["database"])
+    prefix = f"REPLICATION_{target['name'].upper()}_"
+    db_config["user"] = os.environ.get(prefix + "USER", db_config["user"])
+    db_config["password"] = os.environ.get(prefix + "PASSWORD", db_config["password"])
+    return db_config
+
+
+if __name__ == "__main__":
+    cd = os.getcwd()
+    config_dir = os.path.join(cd, "config")
+    config_file_path = os.path.join(config_dir, "config.json")
+
+    # Load configuration
+    with open(config_file_path, "r") as config_file:
+        config = json.load(config_file)
+
+    replication = config["replication"]
+    source_engine = mysql_engine(config["database"])
+    target_engines = {target["name"]: mysql_engine(target_database(target)) for target in replication["targets"]}
+
+    print(f"Replicating '{replication['table']}' to {len(target_engines)} targets at {datetime.now()}")
+    fan_out_sync(
+        source_engine,
+        target_engines,
+        replication["table"],
+        key=replication.get("key", "pkey"),
+        chunk_size=replication.get("chunk_size", 5000),
+        workers=replication.get("workers")
+    )
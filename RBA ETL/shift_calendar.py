@@ -0,0 +1,154 @@
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+SECONDS_PER_DAY = 24 * 60 * 60
+NS_PER_SECOND = 1_000_000_000
+
+
+def _seconds_of_day(clock: str) -> int:
+    """Parse a "HH:MM:SS" config string into seconds after midnight"""
+    parsed = datetime.strptime(clock, "%H:%M:%S")
+    return parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+
+
+def _in_shift(start: int, end: int, second: int) -> bool:
+    """Whether a second of the day falls in [start, end), wrapping past midnight"""
+    if start < end:
+        return start <= second < end
+    if start > end:
+        return second >= start or second < end
+    return True
+
+
+def compile_shift_calendar(shift_time: dict) -> dict:
+    """Compile config["shift_time"] once into sorted second-of-day boundaries.
+
+    Works for any number of shifts, including ones that cross midnight. Each
+    segment between two boundaries takes the first shift (in config order)
+    covering it; uncovered segments are labelled None. The start of the first
+    shift is where the foundry day begins.
+    """
+    shifts = [(name, _seconds_of_day(start), _seconds_of_day(end)) for name, (start, end) in shift_time.items()]
+
+    points = {0}
+    for _, start, end in shifts:
+        points.update((start, end))
+    boundaries = np.array(sorted(point for point in points if point < SECONDS_PER_DAY), dtype=np.int64)
+
+    labels = np.full(len(boundaries), None, dtype=object)
+    for i, boundary in enumerate(boundaries):
+        for name, start, end in shifts:
+            if _in_shift(start, end, boundary):
+                labels[i] = name
+                break
+
+    return {
+        'boundaries': boundaries,
+        'labels': labels,
+        'first_shift_start': shifts[0][1] if shifts else 0,
+    }
+
+
+def assign_shifts(shift_calendar: dict, datetimes: pd.Series) -> pd.Series:
+    """Label a whole datetime column with its shift in one vectorized pass"""
+    ns = pd.to_datetime(pd.Series(datetimes)).to_numpy(dtype='datetime64[ns]').view('int64')
+    nat = ns == np.iinfo(np.int64).min
+
+    seconds = np.mod(ns, SECONDS_PER_DAY * NS_PER_SECOND) // NS_PER_SECOND
+    segment = np.searchsorted(shift_calendar['boundaries'], seconds, side='right') - 1
+
+    shifts = shift_calendar['labels'][segment]
+    shifts[nat] = None
+    return pd.Series(shifts, index=datetimes.index, name='shift')
+
+
+def _before_first_shift(shift_calendar: dict, datetimes: pd.Series) -> np.ndarray:
+    """Rows whose time of day falls before the first shift starts"""
+    ns = datetimes.to_numpy(dtype='datetime64[ns]').view('int64')
+    seconds = np.mod(ns, SECONDS_PER_DAY * NS_PER_SECOND) // NS_PER_SECOND
+    return (seconds < shift_calendar['first_shift_start']) & (ns != np.iinfo(np.int64).min)
+
+
+def to_foundry_date(shift_calendar: dict, datetimes: pd.Series) -> pd.Series:
+    """Move wall-clock datetimes before the first shift start back onto the previous foundry day"""
+    datetimes = pd.to_datetime(pd.Series(datetimes))
+    return datetimes - pd.to_timedelta(_before_first_shift(shift_calendar, datetimes).astype(int), unit='D')
+
+
+def to_wall_clock(shift_calendar: dict, datetimes: pd.Series) -> pd.Series:
+    """Move foundry-day datetimes before the first shift start forward onto the next calendar day"""
+    datetimes = pd.to_datetime(pd.Series(datetimes))
+    return datetimes + pd.to_timedelta(_before_first_shift(shift_calendar, datetimes).astype(int), unit='D')
+
+
+def _legacy_assign_shift(dt, shift_config):
+    """The previous two-shift per-row rule, kept for the benchmark"""
+    shift_a_start = datetime.strptime(shift_config["A"][0], "%H:%M:%S").time()
+    shift_b_start = datetime.strptime(shift_config["B"][0], "%H:%M:%S").time()
+
+    if shift_a_start <= dt.time() < shift_b_start:
+        return 'A'
+    else:
+        return 'B'
+
+
+def benchmark(rows: int = 1_000_000, legacy_rows: int = 100_000):
+    """Report per-million-row throughput of the shift calendar against per-row apply"""
+    shift_time = {"A": ["07:00:00", "19:00:00"], "B": ["19:00:00", "07:00:00"]}
+    rng = np.random.default_rng(0)
+    datetimes = pd.Series(pd.Timestamp('2025-05-01') + pd.to_timedelta(rng.integers(0, 90 * SECONDS_PER_DAY, rows), unit='s'))
+
+    started = time.perf_counter()
+    shift_calendar = compile_shift_calendar(shift_time)
+    shifts = assign_shifts(shift_calendar, datetimes)
+    calendar_seconds = time.perf_counter() - started
+
+    sample = datetimes.iloc[:legacy_rows]
+    started = time.perf_counter()
+    expected = sample.apply(lambda dt: _legacy_assign_shift(dt, shift_time))
+    legacy_seconds = time.perf_counter() - started
+
+    mismatches = int((expected != shifts.iloc[:legacy_rows]).sum())
+    print(f"Shift calendar: {calendar_seconds * 1_000_000 / rows:.3f}s per million rows ({rows / calendar_seconds:,.0f} rows/s)")
+    print(f"Per-row apply:  {legacy_seconds * 1_000_000 / legacy_rows:.3f}s per million rows ({legacy_rows / legacy_seconds:,.0f} rows/s)")
+    print(f"Mismatches on {legacy_rows} rows: {mismatches}")
+    return mismatches
+
+
+def benchmark_foundry_date(rows: int = 100_000):
+    """Time the foundry-to-wall-clock timestamp step against the old row-wise apply"""
+    shift_time = {"A": ["07:00:00", "19:00:00"], "B": ["19:00:00", "07:00:00"]}
+    rng = np.random.default_rng(0)
+    datetimes = pd.Series(pd.Timestamp('2025-05-01') + pd.to_timedelta(rng.integers(0, 90 * SECONDS_PER_DAY, rows), unit='s'))
+
+    started = time.perf_counter()
+    shift_calendar = compile_shift_calendar(shift_time)
+    timestamps = to_wall_clock(shift_calendar, datetimes)
+    calendar_seconds = time.perf_counter() - started
+
+    frame = pd.DataFrame({'date': datetimes.dt.date, 'time': datetimes.dt.time,
+                          'shift': assign_shifts(shift_calendar, datetimes)})
+
+    def compute_timestamp(row):
+        base_datetime = datetime.combine(row['date'], row['time'])
+        if row['shift'] == 'B' and row['time'] < datetime.strptime("07:00", "%H:%M").time():
+            return base_datetime + pd.Timedelta(days=1)
+        else:
+            return base_datetime
+
+    started = time.perf_counter()
+    expected = frame.apply(compute_timestamp, axis=1)
+    legacy_seconds = time.perf_counter() - started
+
+    mismatches = int((pd.to_datetime(expected) != timestamps).sum())
+    print(f"Foundry calendar: {calendar_seconds * 1000:.1f}ms for {rows} rows")
+    print(f"Row-wise apply:   {legacy_seconds * 1000:.1f}ms for {rows} rows")
+    print(f"Mismatches: {mismatches}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark_foundry_date()
@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import pandas as pd
+from bulk_writer import write_frame
+
+
+def target_high_water_mark(target_engine, table_name: str, key: str = "pkey"):
+    """Largest key already in the target table (an index lookup), None when it is empty"""
+    with closing(target_engine.raw_connection()) as connection:
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(f"SELECT MAX(`{key}`) FROM `{table_name}`")
+            return cursor.fetchone()[0]
+
+
+def stream_source_chunks(source_engine, table_name: str, after_key=None, key: str = "pkey", chunk_size: int = 5000):
+    """Yield source rows with key above after_key in key order, chunk_size rows at a time.
+
+    stream_results makes pymysql use a server-side (unbuffered) cursor, so only
+    one chunk is held in memory however far behind the target is.
+    """
+    where_clause = f"WHERE `{key}` > {int(after_key)}" if after_key is not None else ""
+    query = f"SELECT * FROM `{table_name}` {where_clause} ORDER BY `{key}`"
+    with source_engine.connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql(query, con=connection, chunksize=chunk_size):
+            yield chunk
+
+
+def write_chunk(target_connection, table_name: str, chunk: pd.DataFrame, key: str = "pkey", batch_size: int = 1000):
+    """Upsert one chunk on key and commit it, so the high-water mark only moves over committed rows"""
+    try:
+        write_frame(chunk, table_name, target_connection, mode="upsert", batch_size=batch_size, upsert_keys=(key,))
+        target_connection.commit()
+    except Exception:
+        target_connection.rollback()
+        raise
+
+
+def sync_table(source_engine, target_engine, table_name: str, key: str = "pkey", chunk_size: int = 5000) -> int:
+    """Copy the source rows above the target's high-water mark, chunk by chunk"""
+    started = time.perf_counter()
+    high_water_mark = target_high_water_mark(target_engine, table_name, key)
+    print(f"High-water mark for '{table_name}': {key} = {high_water_mark}")
+
+    copied = 0
+    with closing(target_engine.raw_connection()) as target_connection:
+        for chunk in stream_source_chunks(source_engine, table_name, high_water_mark, key, chunk_size):
+            write_chunk(target_connection, table_name, chunk, key)
+            copied += len(chunk)
+            print(f"Synced {copied} rows, {key} up to {chunk[key].iloc[-1]}")
+
+    print(f"Sync of '{table_name}' finished: {copied} rows in {time.perf_counter() - started:.2f}s")
+    return copied
+
+
+def fan_out_sync(source_engine, target_engines: dict, table_name: str, key: str = "pkey",
+                 chunk_size: int = 5000, workers: int = None) -> dict:
+    """Read new source chunks once and write each to every target concurrently.
+
+    Streaming starts from the lowest high-water mark among the targets; each
+    target only receives the rows above its own mark. A target that fails is
+    dropped for the rest of the run without holding back the others. Returns
+    the number of rows copied per target.
+    """
+    started = time.perf_counter()
+    marks = {name: target_high_water_mark(engine, table_name, key) for name, engine in target_engines.items()}
+    for name, mark in marks.items():
+        print(f"[{name}] high-water mark: {key} = {mark}")
+
+    known_marks = [mark for mark in marks.values() if mark is not None]
+    start_after = None if len(known_marks) < len(marks) else min(known_marks)
+
+    copied = {name: 0 for name in target_engines}
+    failed = {}
+    connections = {name: engine.raw_connection() for name, engine in target_engines.items()}
+
+    def write_target(name, chunk):
+        if marks[name] is not None:
+            chunk = chunk[chunk[key] > marks[name]]
+        if len(chunk) > 0:
+            write_chunk(connections[name], table_name, chunk, key)
+            copied[name] += len(chunk)
+        return len(chunk)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or len(target_engines)) as pool:
+            for chunk in stream_source_chunks(source_engine, table_name, start_after, key, chunk_size):
+                active = [name for name in target_engines if name not in failed]
+                if not active:
+                    break
+                futures = {name: pool.submit(write_target, name, chunk) for name in active}
+                for name, future in futures.items():
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed[name] = e
+                        print(f"[{name}] failed, skipping it for the rest of this run: {e}")
+                progress = ", ".join(f"{name}: {copied[name]}" for name in active if name not in failed)
+                print(f"Chunk up to {key} {chunk[key].iloc[-1]} written ({progress})")
+    finally:
+        for connection in connections.values():
+            connection.close()
+
+    for name in target_engines:
+        status = f"FAILED ({failed[name]})" if name in failed else "ok"
+        print(f"[{name}] {copied[name]} rows copied, {status}")
+    print(f"Fan-out sync of '{table_name}' finished in {time.perf_counter() - started:.2f}s")
+    return copied
@@ -5,85 +5,146 @@ import json
 import os
 import warnings
 import pymysql
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from datetime import datetime
 
-warnings.filterwarnings("ignore")
+from shift_calendar import compile_shift_calendar, assign_shifts, to_foundry_date
+from bulk_writer import write_report_rows, ensure_report_summary
 
-def get_last_processed_timestamp(connection):
-    try:
-        with connection.cursor() as cursor:
-            sql = "SELECT last_timestamp FROM mixer_report_test_logger_id ORDER BY id DESC LIMIT 1"
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            if result and result['last_timestamp']:
-                return pd.to_datetime(result['last_timestamp'])
-            else:
-                return None
-    except Exception as e:
-        print(f"Error getting last processed timestamp: {e}")
-        return None
+warnings.filterwarnings("ignore")
 
-def insert_logger_entry(connection, timestamp):
+def get_last_processed_position(connection):
+    # Only an empty logger means a fresh start; a failed read must not rewind the
+    # cursor to ID 0, so it propagates and the cycle is skipped
+    with connection.cursor() as cursor:
+        sql = "SELECT last_timestamp, last_id FROM mixer_report_test_logger_id ORDER BY id DESC LIMIT 1"
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        if result:
+            last_timestamp = pd.to_datetime(result['last_timestamp']) if result['last_timestamp'] else None
+            return last_timestamp, result['last_id']
+        else:
+            return None, None
+
+def commit_etl_batch(connection, df, target_table, timestamp, last_id, bulk_write):
+    # Report rows and the logger cursor are committed together or not at all
     try:
+        write_report_rows(df, target_table, connection, bulk_write)
         with connection.cursor() as cursor:
-            sql = "INSERT INTO mixer_report_test_logger_id (last_timestamp) VALUES (%s)"
-            cursor.execute(sql, (timestamp,))
+            sql = "INSERT INTO mixer_report_test_logger_id (last_timestamp, last_id) VALUES (%s, %s)"
+            cursor.execute(sql, (timestamp, last_id))
         connection.commit()
-        print(f"Logger updated with timestamp: {timestamp}")
-    except Exception as e:
-        print(f"Error inserting logger entry: {e}")
+        print(f"Committed {len(df)} records, logger timestamp: {timestamp}, last ID: {last_id}")
+    except Exception:
         connection.rollback()
+        raise
+
+def resolve_last_id(engine, last_timestamp, last_id):
+    # Logger rows written before the ID cursor existed only carry a timestamp
+    if last_id is not None:
+        return int(last_id)
+    if last_timestamp is None:
+        return 0
+    result = pd.read_sql(
+        text("SELECT COALESCE(MAX(ID), 0) AS last_id FROM mixer WHERE Date_Time <= :last_timestamp"),
+        engine, params={"last_timestamp": last_timestamp.to_pydatetime()}
+    )
+    return int(result.iloc[0]['last_id'])
 
-def assign_shift(dt, shift_config):
-    time_only = dt.time()
-    shift_a_start = datetime.strptime(shift_config["A"][0], "%H:%M:%S").time()
-    shift_b_start = datetime.strptime(shift_config["B"][0], "%H:%M:%S").time()
-
-    if shift_a_start <= time_only < shift_b_start:
-        return 'A'
-    else:
-        return 'B'
+def fetch_page(engine, last_id, page_size):
+    return pd.read_sql(
+        text("SELECT * FROM mixer WHERE ID > :last_id ORDER BY ID LIMIT :page_size"),
+        engine, params={"last_id": last_id, "page_size": page_size}
+    )
 
-def run_etl(config, engine, connection, target_table):
-    last_timestamp = get_last_processed_timestamp(connection)
-    if last_timestamp:
-        print(f"Last processed timestamp: {last_timestamp}")
-    else:
-        print("No previous timestamp found. Processing all records.")
+def assign_batch_counters(df, config, connection, target_table):
+    # Number batches within each Batch_reset group, continuing from what earlier pages stored,
+    # so the upsert key (mixer_name, timestamp, batch_counter) is never NULL
+    shift_calendar = compile_shift_calendar(config['shift_time'])
+    first_shift_start = pd.Timedelta(seconds=shift_calendar['first_shift_start'])
+    df = df.sort_values(by='timestamp')
+    df['date'] = to_foundry_date(shift_calendar, df['timestamp']).dt.date
+    df['batch_counter'] = df.groupby(config['Batch_reset']).cumcount() + 1
+
+    for keys, group in df.groupby(config['Batch_reset']):
+        keys = keys if isinstance(keys, tuple) else (keys,)
+        conditions = ["mixer_name = %s", "timestamp < %s"]
+        params = [config['Mixer Name'], group['timestamp'].min().to_pydatetime()]
+        for column, value in zip(config['Batch_reset'], keys):
+            if column == 'date':
+                # A foundry day starts with the first shift
+                conditions.append("timestamp >= %s")
+                params.append((pd.Timestamp(value) + first_shift_start).to_pydatetime())
+            else:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        with connection.cursor() as cursor:
+            sql = f"SELECT COALESCE(MAX(batch_counter), 0) AS stored FROM {target_table} WHERE {' AND '.join(conditions)}"
+            cursor.execute(sql, params)
+            stored = int(cursor.fetchone()['stored'])
+        df.loc[group.index, 'batch_counter'] += stored
+    return df
 
-    print("Loading source data from 'mixer' table...")
-    df = pd.read_sql("SELECT * FROM mixer ORDER BY ID DESC LIMIT 10000", engine)
+def transform_page(df, config, connection, target_table):
     df['Date_Time'] = pd.to_datetime(df['Date_Time'])
-
-    if last_timestamp:
-        df = df[df['Date_Time'] > last_timestamp]
-
-    if df.empty:
-        print("No new records found.")
-        return df, None
-
     df['timestamp'] = df['Date_Time']
-    df['shift'] = df['Date_Time'].apply(lambda x: assign_shift(x, config['shift_time']))
+    df['shift'] = assign_shifts(compile_shift_calendar(config['shift_time']), df['Date_Time'])
     df['mixer_name'] = config['Mixer Name']
     df['component_id'] = None
+    df = assign_batch_counters(df, config, connection, target_table)
 
     rename_map = config['columns_to_rename']
     df.rename(columns=rename_map, inplace=True)
 
-    for col in config['columns_to_select']:
+    # timestamp is not listed in config, it always leads the selection
+    columns_to_select = [col for col in config['columns_to_select'] if col != 'timestamp']
+    columns_to_select.insert(0, 'timestamp')
+    for col in columns_to_select:
         if col not in df.columns:
             df[col] = np.nan
 
-    df = df[config['columns_to_select']]
-    df = df.sort_values(by='timestamp')
-    latest_timestamp = df['timestamp'].max()
+    df = df[columns_to_select]
+    return df.sort_values(by='timestamp')
 
-    print(f"Inserting {len(df)} new records into {target_table}...")
-    df.to_sql(target_table, con=engine, if_exists='append', index=False)
-    insert_logger_entry(connection, latest_timestamp)
+def run_etl(config, engine, connection, target_table):
+    last_timestamp, last_id = get_last_processed_position(connection)
+    if last_timestamp:
+        print(f"Last processed timestamp: {last_timestamp}")
+    else:
+        print("No previous timestamp found. Processing all records.")
 
-    return df, latest_timestamp
+    last_id = resolve_last_id(engine, last_timestamp, last_id)
+    page_size = config.get('page_size', 5000)
+    bulk_write = config.get('bulk_write', {"mode": "multi", "batch_size": 1000})
+    print(f"Loading source data from 'mixer' table after ID {last_id}...")
+
+    # Page through new rows by ID until caught up, committing the cursor after each page
+    total_records = 0
+    latest_timestamp = last_timestamp
+    while True:
+        page = fetch_page(engine, last_id, page_size)
+        if page.empty:
+            break
+
+        page_last_id = int(page['ID'].max())
+        df = transform_page(page, config, connection, target_table)
+        page_latest = df['timestamp'].max()
+        if latest_timestamp is None or page_latest > latest_timestamp:
+            latest_timestamp = page_latest
+
+        print(f"Inserting {len(df)} new records into {target_table}...")
+        commit_etl_batch(connection, df, target_table, latest_timestamp, page_last_id, bulk_write)
+
+        last_id = page_last_id
+        total_records += len(df)
+        if len(page) < page_size:
+            break
+
+    if total_records == 0:
+        print("No new records found.")
+        return 0, None
+
+    return total_records, latest_timestamp
 
 if __name__ == "__main__":
     cd = os.getcwd()
@@ -100,13 +161,21 @@ if __name__ == "__main__":
         password=db['password'],
         database=db['database_name'],
         port=int(db['port']),
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=config.get('bulk_write', {}).get('mode') == "load_data"
     )
 
+    # Row count and timestamp range the API reads for unfiltered requests
+    ensure_report_summary("mixer_report_test", connection)
+
     try:
         while True:
             print(f"Running ETL at {datetime.now()}")
-            df, latest_ts = run_etl(config, engine, connection, "mixer_report_test")
+            try:
+                connection.ping(reconnect=True)
+                inserted, latest_ts = run_etl(config, engine, connection, "mixer_report_test")
+            except Exception as e:
+                print(f"ETL cycle skipped: {e}")
             time.sleep(60)
     except KeyboardInterrupt:
         print("ETL terminated by user.")
@@ -1,5 +1,5 @@
-import pandas as pd
 from sqlalchemy import create_engine
+from table_sync import sync_table
 
 # === 1. Configuration ===
 source_db = {
@@ -30,17 +30,8 @@ target_engine = create_engine(
     f"mysql+pymysql://{target_db['user']}:{target_db['password']}@{target_db['host']}:{target_db['port']}/{target_db['database']}"
 )
 
-# === 4. Fetch data from source ===
-print(f"Fetching data from '{source_db['database']}.{table_name}'...")
-df = pd.read_sql_table(table_name, con=source_engine)
-
-# Remove duplicates based on primary key 'pkey'
-existing_pkeys = pd.read_sql(f"SELECT pkey FROM {table_name}", target_engine)
-df = df[~df['pkey'].isin(existing_pkeys['pkey'])]
-
-
-# === 5. Insert data into target ===
-print(f"Inserting into '{target_db['database']}.{table_name}'...")
-df.to_sql(table_name, con=target_engine, if_exists='append', index=False)
+# === 4. Copy rows above the target's pkey high-water mark ===
+print(f"Syncing '{source_db['database']}.{table_name}' into '{target_db['database']}.{table_name}'...")
+sync_table(source_engine, target_engine, table_name, key="pkey", chunk_size=5000)
 
 print("✅ Data migrated successfully.")
@@ -10,38 +10,48 @@ from sqlalchemy import create_engine
 from datetime import datetime, timedelta
 import pandas as pd
 from functools import lru_cache
+from shift_calendar import compile_shift_calendar, assign_shifts, to_foundry_date, to_wall_clock
+from bulk_writer import write_report_rows, ensure_report_summary
  
 warnings.filterwarnings("ignore")
 
 def get_last_processed_timestamp(connection):
     """Get the last processed timestamp from the logger table (most recent entry)"""
-    try:
-        with connection.cursor() as cursor:
-            # Get the most recent row by ID (descending order)
-            sql = "SELECT last_timestamp FROM additive_report_dummy_logger_id ORDER BY id DESC LIMIT 1"
-            cursor.execute(sql)
-            result = cursor.fetchone()
-            
-            if result and result['last_timestamp']:
-                return pd.to_datetime(result['last_timestamp'])
-            else:
-                return None
-    except Exception as e:
-        print(f"Error getting last processed timestamp: {e}")
-        return None
+    # Only an empty logger means a fresh start; a failed read propagates so the cycle is
+    # skipped instead of reprocessing (and in multi mode re-inserting) the whole history
+    with connection.cursor() as cursor:
+        # Get the most recent row by ID (descending order)
+        sql = "SELECT last_timestamp FROM additive_report_dummy_logger_id ORDER BY id DESC LIMIT 1"
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        
+        if result and result['last_timestamp']:
+            return pd.to_datetime(result['last_timestamp'])
+        else:
+            return None
 
-def insert_logger_entry(connection, timestamp):
-    """Insert a new row in the logger table with the current timestamp"""
+def commit_etl_batch(connection, df, target_table, timestamp, bulk_write):
+    """Write the report rows and the new logger entry in a single transaction"""
     try:
+        changed = write_report_rows(df, target_table, connection, bulk_write)
         with connection.cursor() as cursor:
-            sql = "INSERT INTO additive_report_dummy_logger_id (last_timestamp) VALUES (%s)"
-            cursor.execute(sql, (timestamp,))
+            if timestamp is not None:
+                sql = "INSERT INTO additive_report_dummy_logger_id (last_timestamp) VALUES (%s)"
+                cursor.execute(sql, (timestamp,))
+            elif changed:
+                # Rows were only rewritten in place: a new logger id with the same watermark
+                # still invalidates the API response caches and ETags. Re-upserting unchanged
+                # overlap rows leaves both alone
+                sql = ("INSERT INTO additive_report_dummy_logger_id (last_timestamp) "
+                       "SELECT last_timestamp FROM additive_report_dummy_logger_id ORDER BY id DESC LIMIT 1")
+                cursor.execute(sql)
         
         connection.commit()
-        print(f"New logger entry created: Last timestamp = {timestamp}")
-    except Exception as e:
-        print(f"Error inserting logger entry: {e}")
+        print(f"Committed {len(df)} records, last timestamp = {timestamp}")
+    except Exception:
+        # Nothing from this batch is kept, the next run resumes from the previous entry
         connection.rollback()
+        raise
 
 def run_etl(config, engine, connection, target_table):
     """Main ETL function"""
@@ -61,15 +71,9 @@ def run_etl(config, engine, connection, target_table):
     # Convert datetime string to pandas datetime
     df_add['datetime'] = pd.to_datetime(df_add['Date_Time'], format='%Y-%m-%d %H:%M:%S')
  
-    def date_adjust(data: pd.DataFrame, col_name: str, to_foundry: bool):
-        shift_cutoff = pd.to_datetime(config["shift_time"]["A"][0]).time()
-        multiplier = 1 if to_foundry else -1
- 
-        time_mask = data[col_name].dt.time < shift_cutoff
-        data["datetime"] = data["datetime"] + pd.to_timedelta(time_mask.astype(int) * -1 * multiplier, unit='D')
-        return data
- 
-    df_add = date_adjust(df_add, "datetime", True)
+    # Move early-morning readings onto the foundry day they belong to
+    shift_calendar = compile_shift_calendar(config["shift_time"])
+    df_add['datetime'] = to_foundry_date(shift_calendar, df_add['datetime'])
  
     # Define column pairs for cleaning
     column_pairs = [
@@ -169,30 +173,11 @@ def run_etl(config, engine, connection, target_table):
     matched_df['component_id'] = matched_df['datetime'].astype(str).apply(get_component_id)
     matched_df['mixer_name'] = config['Mixer Name']
    
-    # Assign shift based on time
-    def assign_shift(row):
-        shift_a_start = datetime.strptime(config["shift_time"]["A"][0], "%H:%M:%S").time()
-        shift_b_start = datetime.strptime(config["shift_time"]["B"][0], "%H:%M:%S").time()
-       
-        if shift_a_start <= row.time() < shift_b_start:
-            return 'A'
-        else:
-            return 'B'
-   
-    matched_df['shift'] = matched_df['datetime'].apply(lambda dt: assign_shift(dt))
- 
-    # Create the timestamp column properly accounting for shift
-    def compute_timestamp(row):
-        base_datetime = datetime.combine(row['date'], row['time'])
-       
-        # Adjust for B shift times after midnight
-        if row['shift'] == 'B' and row['time'] < datetime.strptime("07:00", "%H:%M").time():
-            return base_datetime + timedelta(days=1)  
-        else:
-            return base_datetime
+    # Assign shift based on time, for every shift defined in config
+    matched_df['shift'] = assign_shifts(shift_calendar, matched_df['datetime'])
  
-    # Create the timestamp column
-    matched_df['timestamp'] = matched_df.apply(compute_timestamp, axis=1)
+    # Create the timestamp column, moving the tail of the foundry day onto the next calendar day
+    matched_df['timestamp'] = to_wall_clock(shift_calendar, matched_df['datetime'])
     
     # List of columns to select (excluding date and time, including timestamp)
     columns_to_select = [col for col in config["columns_to_select"] if col not in ['date', 'time']]
@@ -225,13 +210,21 @@ def run_etl(config, engine, connection, target_table):
     df.rename(columns=output_columns, inplace=True)
    
     # Filter out records that already exist in the database
+    upsert = config.get("bulk_write", {}).get("mode") == "upsert"
     if last_timestamp is not None:
-        new_records = df[df['timestamp'] > last_timestamp]
-        old_records = df[df['timestamp'] <= last_timestamp]
+        if upsert:
+            # Rewrite the overlap window too, so batches sharing the watermark second
+            # and late lab values are upserted instead of skipped
+            cutoff = last_timestamp - pd.Timedelta(minutes=config.get("upsert_overlap_minutes", 0))
+            keep = df['timestamp'] >= cutoff
+        else:
+            keep = df['timestamp'] > last_timestamp
+        new_records = df[keep]
+        old_records = df[~keep]
         print(f"Total records: {len(df)}")
         df.to_excel("output_full.xlsx", index=False)  # Save full output for review
         print(f"Records already in database: {len(old_records)}")
-        print(f"New records to insert: {len(new_records)}")
+        print(f"{'Records to upsert' if upsert else 'New records to insert'}: {len(new_records)}")
         df = new_records
     
     # If no new records, return empty dataframe with the latest timestamp
@@ -241,6 +234,9 @@ def run_etl(config, engine, connection, target_table):
     
     # Get the latest timestamp from the new records
     latest_timestamp = df['timestamp'].max()
+    if last_timestamp is not None and latest_timestamp <= last_timestamp:
+        # Only the overlap window was rewritten, the watermark stays where it is
+        latest_timestamp = None
     
     # Show sample data
     print("Sample of new data to be inserted:")
@@ -272,6 +268,9 @@ if __name__ == "__main__":
     # Create database engine for pandas
     engine = create_engine(f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
     
+    # Bulk write settings for the report table
+    bulk_write = config.get("bulk_write", {"mode": "multi", "batch_size": 1000})
+
     # Create a direct pymysql connection for more efficient execution and transactions
     connection = pymysql.connect(
         host=DB_HOST,
@@ -279,12 +278,16 @@ if __name__ == "__main__":
         user=DB_USER,
         password=DB_PASSWORD,
         database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
+        cursorclass=pymysql.cursors.DictCursor,
+        local_infile=bulk_write["mode"] == "load_data"
     )
     
     # Define target table
     target_table = "additive_report_dummy_rename"
    
+    # Row count and timestamp range the API reads for unfiltered requests
+    ensure_report_summary(target_table, connection)
+
     print("Starting ETL process...")
  
     # Main ETL loop
@@ -293,17 +296,16 @@ if __name__ == "__main__":
             current_time = datetime.now()
             print(f"Running ETL at {current_time}")
             try:
+                # Reopen the connection if the server dropped it between runs
+                connection.ping(reconnect=True)
                 # Run ETL process
                 df, latest_timestamp = run_etl(config, engine, connection, target_table)
                 
                 # Insert data to the correct table with timestamp column, but only if there are new records
                 if not df.empty:
                     print(f"Writing {len(df)} new records to table: {target_table}")
-                    df.to_sql(target_table, con=engine, if_exists='append', index=False)
-                    
-                    # Insert a new log entry with the latest timestamp
-                    if latest_timestamp:
-                        insert_logger_entry(connection, latest_timestamp)
+                    # Report rows and the new logger entry are committed together
+                    commit_etl_batch(connection, df, target_table, latest_timestamp, bulk_write)
                     
                     print("ETL process completed successfully.")
                 else:
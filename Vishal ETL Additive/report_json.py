@@ -0,0 +1,107 @@
+import json
+import math
+import sqlite3
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from datetime import time as time_of_day
+from decimal import Decimal
+
+# orjson is several times faster than the stdlib encoder, used when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _timedelta_str(value: timedelta) -> str:
+    """Format a timedelta the way pandas astype(str) does, e.g. "0 days 00:05:00" """
+    hours, remainder = divmod(value.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    sign = "+" if value.days < 0 else ""
+    fraction = f".{value.microseconds:06d}" if value.microseconds else ""
+    return f"{value.days} days {sign}{hours:02d}:{minutes:02d}:{seconds:02d}{fraction}"
+
+
+def _default(value):
+    """Encode the driver types JSON has no native form for"""
+    if isinstance(value, datetime):
+        return str(value)
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return _timedelta_str(value)
+    if isinstance(value, Decimal):
+        return None if value.is_nan() else float(value)
+    if isinstance(value, bytes):
+        return value.decode()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def fetch_records(connection, query: str, params=None) -> list:
+    """Run query (with optional %s params) on a DB-API connection and return the rows as dicts, NaN as None"""
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(query) if params is None else cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+
+    return [
+        dict(zip(columns, [None if value.__class__ is float and math.isnan(value) else value for value in row]))
+        for row in rows
+    ]
+
+
+def dumps(payload) -> bytes:
+    """Serialize a response payload to JSON bytes without going through pandas"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def _pandas_page(connection, query: str) -> bytes:
+    """The previous read_sql / astype(str) / to_dict path, kept for the benchmark"""
+    import pandas as pd
+
+    df = pd.read_sql(query, con=connection)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) or pd.api.types.is_timedelta64_dtype(df[col]):
+            df[col] = df[col].astype(str)
+    return json.dumps({'status': 'success', 'data': df.to_dict(orient='records')}).encode()
+
+
+def benchmark(page_sizes=(100, 5000), seconds: float = 2.0):
+    """Compare requests/sec of the pandas and the DB-API paths on an in-memory SQLite table"""
+    connection = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    connection.execute(
+        "CREATE TABLE additive_report_dummy_rename (id INTEGER PRIMARY KEY, timestamp TIMESTAMP, "
+        "mixer_name TEXT, batch_counter INTEGER, recycle_sand_actual REAL, bentonite_actual REAL, "
+        "moisture_smc_pct REAL, compactability_smc_pct REAL)"
+    )
+    start = datetime(2025, 5, 1, 7)
+    connection.executemany(
+        "INSERT INTO additive_report_dummy_rename VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(i, start + timedelta(minutes=i), "Mixer 1", i % 500, 2500.0 + i % 97, 31.5 + i % 7,
+          None if i % 20 == 0 else 3.2, 38.0 + i % 5) for i in range(max(page_sizes))]
+    )
+
+    for page_size in page_sizes:
+        query = f"SELECT * FROM additive_report_dummy_rename ORDER BY timestamp DESC LIMIT {page_size}"
+        paths = {
+            "pandas": lambda: _pandas_page(connection, query),
+            "DB-API": lambda: dumps({'status': 'success', 'data': fetch_records(connection, query)}),
+        }
+        for name, serve_page in paths.items():
+            requests = 0
+            started = time.perf_counter()
+            while time.perf_counter() - started < seconds:
+                serve_page()
+                requests += 1
+            elapsed = time.perf_counter() - started
+            print(f"{page_size:>5} rows, {name:<6} path: {requests / elapsed:,.0f} requests/s")
+
+    connection.close()
+
+
+if __name__ == "__main__":
+    print(f"Encoder: {'orjson' if orjson is not None else 'json'}")
+    benchmark()